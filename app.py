@@ -1,108 +1,1668 @@
-from flask import Flask, request, jsonify, render_template
-from flask_sqlalchemy import SQLAlchemy
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
+import time
+
+STARTED = time.perf_counter()
+
+from flask import (
+    Blueprint, Flask, Response, current_app, g, request, jsonify, send_file, stream_template, stream_with_context,
+    url_for,
+)
+from jinja2 import FileSystemBytecodeCache
+from flask_jwt_extended import (
+    JWTManager, create_access_token, get_jwt_identity, jwt_required, set_access_cookies, unset_jwt_cookies,
+)
 from flask_cors import CORS
-from datetime import datetime
-from flask_migrate import Migrate
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from contextlib import nullcontext
+from compression import Compression
+from database import WriteQueueFull, WriteSerializer, configure_engine, database_uri, engine_options
+from attendance_bitmap import (
+    MAX_CODE, UNMARKED, StatusDictionary, count_codes, day_range, empty_month, marked_days, with_day,
+)
+from jobs import FINISHED, JobRunner, TableBackend
+from json_provider import FastJSONProvider
+from metrics import Metrics
+from models import (
+    db, Attendance, AttendanceArchive, AttendanceMonth, AttendanceMonthArchive, AttendanceRollup, AttendanceStatus,
+    ChangeLog, DataPartition, Employee, Job, Offboarding, Onboarding, Payroll, PayrollArchive, PayrollRun,
+    ResourceVersion, Role, User, WorkforceEvent, to_cents,
+)
+from partitions import (
+    PERIODS, PeriodClosed, ReadOnlyEngines, next_period, partition_name, partition_table, period_start,
+)
+from passwords import HashQueueFull, PasswordHasher, RateLimiter
+from report_cache import MemoryBackend, RedisBackend, ReportCache
+from sqlalchemy import and_, create_engine, delete, event, func, insert, inspect, or_, select, text
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.exc import IntegrityError
+from collections import Counter, defaultdict
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+import base64
+import click
+import csv
+import hashlib
+import heapq
+import io
+import json
 import os
+import re
+import threading
+
+api = Blueprint('api', __name__, cli_group=None)
+
+if os.environ.get('REPORT_CACHE_URL'):
+    report_cache_backend = RedisBackend(os.environ['REPORT_CACHE_URL'])
+else:
+    report_cache_backend = MemoryBackend(maxsize=int(os.environ.get('REPORT_CACHE_SIZE', 256)))
+report_cache = ReportCache(report_cache_backend, ttl=int(os.environ.get('REPORT_CACHE_TTL', 300)))
+# Resolved token identities, per process. Writes through /users and /role
+# evict entries here; other workers pick changes up within the TTL.
+identity_cache = MemoryBackend(maxsize=int(os.environ.get('IDENTITY_CACHE_SIZE', 10000)))
+payroll_run_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('PAYROLL_RUN_WORKERS', 2)), thread_name_prefix='payroll-run'
+)
+password_hasher = PasswordHasher(
+    max_workers=int(os.environ.get('PASSWORD_HASH_WORKERS', 2)),
+    max_queue=int(os.environ.get('PASSWORD_HASH_QUEUE_LIMIT', 32)),
+)
+# Checked before any hashing: a flood against one account or from one
+# address is turned away without costing CPU.
+login_account_limiter = RateLimiter(
+    limit=int(os.environ.get('LOGIN_ACCOUNT_LIMIT', 5)),
+    window=int(os.environ.get('LOGIN_ACCOUNT_WINDOW', 300)),
+)
+login_ip_limiter = RateLimiter(
+    limit=int(os.environ.get('LOGIN_IP_LIMIT', 30)),
+    window=int(os.environ.get('LOGIN_IP_WINDOW', 60)),
+)
+partition_engines = ReadOnlyEngines()
+jwt = JWTManager()
+metrics = Metrics()
+compression = Compression()
+
+@metrics.add_collector
+def report_cache_metrics():
+    for name, value in report_cache.stats().items():
+        yield f'# TYPE hrms_report_cache_{name}_total counter'
+        yield f'hrms_report_cache_{name}_total {value}'
+
+@metrics.add_collector
+def startup_metrics():
+    yield '# TYPE hrms_startup_seconds gauge'
+    yield f"hrms_startup_seconds {current_app.config['STARTUP_SECONDS']}"
+
+def create_app(config=None):
+    """Build the HRMS app. The schema is owned by the Alembic migrations in
+    migrations/; nothing here creates or inspects tables.
+    """
+    app = Flask(__name__, template_folder='template2', static_folder='static')
+    app.json = FastJSONProvider(app)
+    CORS(app, resources={r"/*": {"origins": "*"}}, expose_headers=['X-Next-Cursor', 'ETag'])
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri()
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['JWT_SECRET_KEY'] = 'your_jwt_secret_key'
+    # API clients send the token in the Authorization header; browsers opening
+    # the HTML views send the cookie /login sets. Cookie-authenticated writes
+    # must echo the csrf_access_token cookie in X-CSRF-TOKEN.
+    app.config['JWT_TOKEN_LOCATION'] = ['headers', 'cookies']
+    app.config['JWT_COOKIE_SAMESITE'] = 'Lax'
+    app.config['JWT_COOKIE_SECURE'] = os.environ.get('JWT_COOKIE_SECURE', 'False') == 'True'
+    app.config['PAGE_SIZE'] = 100
+    app.config['MAX_PAGE_SIZE'] = 1000
+    app.config['ATTENDANCE_STATUSES'] = ('Present', 'Absent', 'Late', 'Half Day', 'Leave')
+    # 'rows' keeps one attendance row per employee-day; 'bitmap' packs each
+    # employee-month into attendance_month. Switch with `flask pack-attendance`.
+    app.config['ATTENDANCE_STORAGE'] = os.environ.get('ATTENDANCE_STORAGE', 'rows')
+    app.config['BULK_BATCH_SIZE'] = 5000
+    app.config['PAYROLL_RUN_BATCH_SIZE'] = 1000
+    app.config['EXPORT_CHUNK_SIZE'] = 1000
+    app.config['BATCH_MAX_REQUESTS'] = 500
+    app.config['CHANGES_MAX_WAIT'] = 30
+    app.config['CHANGES_POLL_INTERVAL'] = 1.0
+    app.config['ANALYTICS_MAX_DAYS'] = 3660
+    app.config['PARTITION_DIR'] = os.environ.get('PARTITION_DIR', os.path.join(app.instance_path, 'partitions'))
+    # Background jobs: JOB_WORKERS threads per process (0 leaves them to
+    # `flask job-worker`), and at most JOB_CONCURRENCY[type] running at once.
+    app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+    app.config['JOB_CONCURRENCY'] = {
+        'attendance_report': 2, 'payroll_report': 2, 'attendance_export': 1, 'payroll_export': 1,
+    }
+    app.config['JOB_POLL_INTERVAL'] = 1.0
+    app.config['JOB_PROGRESS_INTERVAL'] = 0.5
+    app.config['JOB_STALE_SECONDS'] = 300
+    app.config['JOB_RESULT_DIR'] = os.environ.get('JOB_RESULT_DIR', os.path.join(app.instance_path, 'jobs'))
+    app.config['IDENTITY_CACHE_TTL'] = int(os.environ.get('IDENTITY_CACHE_TTL', 60))
+    app.config['ROLE_PERMISSIONS'] = {'Admin': ['admin']}
+    if os.environ.get('SLOW_REQUEST_MS'):
+        app.config['SLOW_REQUEST_MS'] = float(os.environ['SLOW_REQUEST_MS'])
+    app.config['DEBUG'] = os.environ.get('FLASK_DEBUG', 'False') == 'True'
+    if config:
+        app.config.update(config)
+    app.config.setdefault(
+        'SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+    )
+
+    if app.config.setdefault('TEMPLATE_CACHE_DIR', os.path.join(app.instance_path, 'jinja_cache')):
+        # Compiled templates survive restarts and are shared by every worker.
+        os.makedirs(app.config['TEMPLATE_CACHE_DIR'], exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['TEMPLATE_CACHE_DIR'])
+
+    db.init_app(app)
+    with app.app_context():
+        configure_engine(db.engine)
+        if db.engine.dialect.name == 'sqlite':
+            # SQLite allows one writer at a time; funnel writes through a
+            # bounded queue instead of letting them pile up on 'database is locked'.
+            app.extensions['write_serializer'] = WriteSerializer(
+                lock_path=db.engine.url.database + '.writelock' if db.engine.url.database else None,
+                max_waiting=int(os.environ.get('WRITE_QUEUE_LIMIT', 32)),
+                timeout=float(os.environ.get('WRITE_QUEUE_TIMEOUT', 10)),
+            )
+    if os.environ.get('FLASK_RUN_FROM_CLI') == 'true':
+        # `flask db ...` is only needed from the CLI, and importing alembic
+        # is a large share of a worker's boot time.
+        from flask_migrate import Migrate
+        Migrate(app, db)
+    jwt.init_app(app)
+    metrics.init_app(app)
+    compression.init_app(app)
+    app.teardown_appcontext(close_partition_connections)
+    app.register_blueprint(api)
+
+    app.config['STARTUP_SECONDS'] = round(time.perf_counter() - STARTED, 4)
+    app.logger.info("HRMS ready in %.0f ms", app.config['STARTUP_SECONDS'] * 1000)
+    return app
+
+def is_sqlite():
+    return db.engine.dialect.name == 'sqlite'
 
-app = Flask(__name__, template_folder='template2', static_folder='static')
-CORS(app, resources={r"/*": {"origins": "*"}})
+def write_serializer():
+    return current_app.extensions.get('write_serializer')
 
-# Ensure the database path is persistent
-db_path = os.path.join(os.path.dirname(__file__), 'instance', 'hrms.db')
-app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['JWT_SECRET_KEY'] = 'your_jwt_secret_key'
+def write_gate():
+    return write_serializer() or nullcontext()
 
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
-jwt = JWTManager(app)
+def busy_response(msg="Server busy, retry shortly", retry_after=1, status=503):
+    response = jsonify({"msg": msg})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, status
 
-@app.before_first_request
-def create_tables():
-    db.create_all()
+# Routes that do slow work before writing take the write lock themselves.
+SELF_GATED_ENDPOINTS = {'api.register', 'api.login'}
 
-@app.errorhandler(Exception)
+@api.before_app_request
+def serialize_writes():
+    serializer = write_serializer()
+    if serializer is None or request.method not in ('POST', 'PUT', 'PATCH', 'DELETE'):
+        return None
+    if request.endpoint in SELF_GATED_ENDPOINTS:
+        return None
+    try:
+        serializer.acquire()
+    except WriteQueueFull:
+        return busy_response("Too many concurrent writes, retry shortly")
+    g.holds_write_lock = True
+
+@api.teardown_app_request
+def release_write_lock(exc):
+    if g.pop('holds_write_lock', False):
+        write_serializer().release()
+
+@api.app_errorhandler(PeriodClosed)
+def handle_period_closed(e):
+    return jsonify({"msg": f"{e.partition} is a closed partition and takes no writes"}), 409
+
+@api.app_errorhandler(Exception)
 def handle_exception(e):
     response = {
         "message": str(e),
         "type": type(e).__name__
     }
-    print(f"Error: {e}")
+    current_app.logger.exception("Unhandled error: %s", e)
     return jsonify(response), 500
 
-class User(db.Model):
-    __tablename__ = 'user'
-    __table_args__ = {'extend_existing': True}
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False)
-    password = db.Column(db.String(120), nullable=False)
-    role_id = db.Column(db.Integer, nullable=False)
-
-    def __repr__(self):
-        return f'<User {self.username}>'
-
-class Role(db.Model):
-    __tablename__ = 'role'
-    __table_args__ = {'extend_existing': True}
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(80), unique=True, nullable=False)
-
-    def __repr__(self):
-        return f'<Role {self.name}>'
-
-class Payroll(db.Model):
-    __tablename__ = 'payroll'
-    __table_args__ = {'extend_existing': True}
-    id = db.Column(db.Integer, primary_key=True)
-    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
-    payment_date = db.Column(db.Date, nullable=False)
-
-    def __repr__(self):
-        return f'<Payroll {self.employee_id} - {self.amount}>'
-
-class Attendance(db.Model):
-    __tablename__ = 'attendance'
-    __table_args__ = {'extend_existing': True}
-    id = db.Column(db.Integer, primary_key=True)
-    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
-    date = db.Column(db.Date, nullable=False)
-    status = db.Column(db.String(50), nullable=False)
-
-    def __repr__(self):
-        return f'<Attendance {self.employee_id} - {self.date} - {self.status}>'
-
-class Employee(db.Model):
-    __tablename__ = 'employee'
-    __table_args__ = {'extend_existing': True}
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
-    email = db.Column(db.String(100), nullable=False, unique=True)
-    phone_number = db.Column(db.String(15), nullable=False)
-    address = db.Column(db.String(200), nullable=False)
-    city = db.Column(db.String(50), nullable=False)
-    state = db.Column(db.String(50), nullable=False)
-    zip_code = db.Column(db.String(20), nullable=False)
-    start_date = db.Column(db.Date, nullable=False)
-
-    def __repr__(self):
-        return f'<Employee {self.name}>'
-
-class Offboarding(db.Model):
-    __tablename__ = 'offboarding'
-    __table_args__ = {'extend_existing': True}
-    id = db.Column(db.Integer, primary_key=True)
-    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
-    offboarding_date = db.Column(db.Date, nullable=False)
-    reason = db.Column(db.String(200), nullable=False)
-
-    def __repr__(self):
-        return f'<Offboarding {self.employee_id}>'
-
-@app.route('/register', methods=['POST'])
+def month_start(day):
+    return day.replace(day=1)
+
+def next_month_start(day):
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+def month_bucket(column):
+    if db.engine.dialect.name == 'sqlite':
+        return func.date(column, 'start of month')
+    return func.date_trunc('month', column)
+
+def period_bucket(column, period):
+    if db.engine.dialect.name == 'sqlite':
+        return func.strftime('%Y-%m' if period == 'month' else '%Y', column)
+    return func.to_char(column, 'YYYY-MM' if period == 'month' else 'YYYY')
+
+def upsert(model):
+    if db.engine.dialect.name == 'postgresql':
+        # Imported here so SQLite deployments don't load the dialect at boot.
+        from sqlalchemy.dialects import postgresql
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+def version_keys(obj):
+    if isinstance(obj, User):
+        return ['users', f'user:{obj.id}']
+    if isinstance(obj, (Attendance, AttendanceMonth)):
+        return [f'attendance:{obj.employee_id}']
+    if isinstance(obj, Onboarding):
+        return [f'onboarding:{obj.id}']
+    if isinstance(obj, Offboarding):
+        return [f'offboarding:{obj.id}']
+    return []
+
+def bump_versions(keys, connection=None):
+    if not keys:
+        return
+    stmt = upsert(ResourceVersion)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['key'],
+        set_={'version': ResourceVersion.version + 1, 'updated_at': stmt.excluded.updated_at},
+    )
+    now = datetime.utcnow()
+    rows = [{'key': key, 'version': 1, 'updated_at': now} for key in sorted(set(keys))]
+    (connection or db.session).execute(stmt, rows)
+
+@event.listens_for(db.session, 'after_flush')
+def bump_flushed_versions(session, flush_context):
+    # Every ORM write to a versioned resource bumps its counters inside the
+    # same transaction, so ETags can never run ahead of the data.
+    keys = []
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        keys.extend(version_keys(obj))
+    bump_versions(keys, session.connection())
+
+CHANGE_ENTITIES = {
+    User: 'user',
+    Role: 'role',
+    Payroll: 'payroll',
+    Attendance: 'attendance',
+    Onboarding: 'onboarding',
+    Offboarding: 'offboarding',
+}
+# Packed attendance has no row ids, so its changes are keyed by employee
+# under entities of their own: 'attendance_day' entries carry the date,
+# 'attendance_month' entries the month.
+PACKED_CHANGE_ENTITIES = ('attendance_day', 'attendance_month')
+CHANGE_EXCLUDED_FIELDS = {'id', 'password'}
+# Any fixed key works; it only has to be the same in every worker.
+CHANGE_LOG_LOCK_KEY = 0x68726d73
+change_feed = threading.Condition()
+
+def change_value(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+def change_data(obj, changed_only=False):
+    state = inspect(obj)
+    data = {}
+    for attr in state.mapper.column_attrs:
+        if attr.key in CHANGE_EXCLUDED_FIELDS:
+            continue
+        if changed_only and not state.attrs[attr.key].history.has_changes():
+            continue
+        data[attr.key] = change_value(getattr(obj, attr.key))
+    return data
+
+def record_changes(session, changes):
+    """Append (entity, entity_id, op, data) tuples to the change log in the
+    session's current transaction."""
+    if not changes:
+        return
+    if session.get_bind().dialect.name == 'postgresql':
+        # Writers queue here until commit, so ids become visible in order
+        # and a reader at cursor N can never miss a later-committing N-1.
+        session.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': CHANGE_LOG_LOCK_KEY})
+    now = datetime.utcnow()
+    session.execute(insert(ChangeLog), [
+        {'entity': entity, 'entity_id': entity_id, 'op': op, 'data': data, 'created_at': now}
+        for entity, entity_id, op, data in changes
+    ])
+    session.info['changes_logged'] = True
+
+@event.listens_for(db.session, 'after_flush')
+def log_flushed_changes(session, flush_context):
+    changes = []
+    for obj in session.new:
+        if type(obj) in CHANGE_ENTITIES:
+            changes.append((CHANGE_ENTITIES[type(obj)], obj.id, 'insert', change_data(obj)))
+    for obj in session.dirty:
+        if type(obj) in CHANGE_ENTITIES and session.is_modified(obj, include_collections=False):
+            data = change_data(obj, changed_only=True)
+            if data:
+                changes.append((CHANGE_ENTITIES[type(obj)], obj.id, 'update', data))
+    for obj in session.deleted:
+        if type(obj) in CHANGE_ENTITIES:
+            changes.append((CHANGE_ENTITIES[type(obj)], obj.id, 'delete', None))
+    record_changes(session, changes)
+
+@event.listens_for(db.session, 'after_commit')
+def notify_change_feed(session):
+    if session.info.pop('changes_logged', False):
+        with change_feed:
+            change_feed.notify_all()
+
+def check_not_modified(keys, vary=''):
+    # Versions are read before the resource itself, so a concurrent write can
+    # only make the tag older than the body, never newer.
+    versions = {
+        key: (version, updated_at)
+        for key, version, updated_at in db.session.query(
+            ResourceVersion.key, ResourceVersion.version, ResourceVersion.updated_at
+        ).filter(ResourceVersion.key.in_(keys))
+    }
+    tag = ';'.join(f'{key}={versions.get(key, (0,))[0]}' for key in keys) + '|' + vary
+    etag = hashlib.sha1(tag.encode()).hexdigest()[:20]
+    updated = [updated_at for _, updated_at in versions.values()]
+    last_modified = max(updated).replace(tzinfo=timezone.utc, microsecond=0) if updated else None
+    if request.if_none_match:
+        modified = not request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since and last_modified:
+        modified = last_modified > request.if_modified_since
+    else:
+        modified = True
+    not_modified = None
+    if not modified:
+        not_modified = with_validators(Response(status=304), etag, last_modified)
+    return etag, last_modified, not_modified
+
+def with_validators(response, etag, last_modified):
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    return response
+
+def bump_attendance_rollup(employee_id, day, status, delta=1):
+    # Keep attendance_rollup in step with the attendance row being written;
+    # runs in the caller's transaction so both commit (or roll back) together.
+    month = month_start(day)
+    rollup = AttendanceRollup.query.filter_by(employee_id=employee_id, month=month, status=status)
+    updated = rollup.update({AttendanceRollup.count: AttendanceRollup.count + delta}, synchronize_session=False)
+    if not updated:
+        db.session.add(AttendanceRollup(employee_id=employee_id, month=month, status=status, count=delta))
+    elif delta < 0:
+        # Rebuilt rollups have no zero counts; don't leave one behind either.
+        rollup.filter(AttendanceRollup.count == 0).delete(synchronize_session=False)
+
+def attendance_is_bitmap():
+    return current_app.config['ATTENDANCE_STORAGE'] == 'bitmap'
+
+def load_attendance_statuses():
+    return dict(db.session.query(AttendanceStatus.name, AttendanceStatus.code))
+
+def create_attendance_status(name):
+    # Runs in the caller's transaction; on_conflict_do_nothing plus the
+    # re-read covers another worker taking the same code first.
+    for _ in range(3):
+        code = (db.session.query(func.max(AttendanceStatus.code)).scalar() or 0) + 1
+        if code > MAX_CODE:
+            raise ValueError('Too many distinct attendance statuses')
+        db.session.execute(upsert(AttendanceStatus).on_conflict_do_nothing(), {'code': code, 'name': name})
+        db.session.info['attendance_status_created'] = True
+        existing = db.session.query(AttendanceStatus.code).filter_by(name=name).scalar()
+        if existing is not None:
+            return existing
+    raise ValueError(f'Could not assign a code to status {name}')
+
+attendance_statuses = StatusDictionary(load_attendance_statuses, create_attendance_status)
+
+@event.listens_for(db.session, 'after_transaction_end')
+def forget_uncommitted_statuses(session, transaction):
+    # The dictionary may have been loaded with a status this transaction
+    # created; drop it so a rollback can't leave an unknown code cached.
+    if transaction.parent is None and session.info.pop('attendance_status_created', False):
+        attendance_statuses.reset()
+
+def mark_attendance_day(employee_id, day, status):
+    """Bitmap-mode insert of one attendance day; False if already marked."""
+    code = attendance_statuses.code(status)
+    month = month_start(day)
+    row = db.session.get(AttendanceMonth, (employee_id, month), with_for_update=True)
+    if row is None:
+        row = AttendanceMonth(employee_id=employee_id, month=month, days=empty_month(month))
+        db.session.add(row)
+    elif row.days[day.day - 1] != UNMARKED:
+        return False
+    row.days = with_day(row.days, day, code)
+    record_changes(db.session, [
+        ('attendance_day', employee_id, 'insert', {'employee_id': employee_id, 'date': day.isoformat(), 'status': status})
+    ])
+    return True
+
+def count_bitmap_days(counts, start_date, end_date, model=AttendanceMonth):
+    status_name = attendance_statuses.name
+    months = db.session.query(
+        model.employee_id, model.month, model.days
+    ).filter(model.month >= month_start(start_date), model.month <= end_date)
+    for employee_id, month, days in months:
+        lo, hi = day_range(month, start_date, end_date)
+        for code, count in count_codes(days[lo:hi]).items():
+            key = (employee_id, status_name(code))
+            counts[key] = counts.get(key, 0) + count
+
+# Models that can be split into period partitions, with their date column.
+PARTITIONED = {'attendance': (Attendance, 'date'), 'payroll': (Payroll, 'payment_date')}
+
+class PartitionSource:
+    """Somewhere a partitioned model's rows live: the live table, a
+    partition table in the database, or a detached read-only file."""
+
+    def __init__(self, table, path=None):
+        self.table = table
+        self.path = path
+
+    def execute(self, stmt):
+        if self.path is None:
+            return db.session.execute(stmt)
+        return partition_connection(self.path).execute(stmt)
+
+def partition_connection(path):
+    connections = g.setdefault('partition_connections', {})
+    if path not in connections:
+        connections[path] = partition_engines.get(path).connect()
+    return connections[path]
+
+def close_partition_connections(exc):
+    for connection in g.pop('partition_connections', {}).values():
+        connection.close()
+
+def partition_sources(model, start_date=None, end_date=None):
+    """Where `model` rows dated within [start_date, end_date] can be, in date
+    order: the overlapping partitions, then the live table. Partitions
+    outside the range are never opened."""
+    query = db.session.query(DataPartition.name, DataPartition.path).filter(
+        DataPartition.base == model.__tablename__
+    )
+    if start_date:
+        query = query.filter(DataPartition.period_end > start_date)
+    if end_date:
+        query = query.filter(DataPartition.period_start <= end_date)
+    sources = [
+        PartitionSource(partition_table(model.__table__, name), path)
+        for name, path in query.order_by(DataPartition.period_start)
+    ]
+    sources.append(PartitionSource(model.__table__))
+    return sources
+
+def closed_periods(model, start_date=None, end_date=None):
+    query = db.session.query(DataPartition.period_start, DataPartition.period_end, DataPartition.name).filter(
+        DataPartition.base == model.__tablename__
+    )
+    if start_date:
+        query = query.filter(DataPartition.period_end > start_date)
+    if end_date:
+        query = query.filter(DataPartition.period_start <= end_date)
+    return query.all()
+
+def closed_period(periods, day):
+    for start, end, name in periods:
+        if start <= day < end:
+            return name
+    return None
+
+def check_open_periods(model, days):
+    # Partitioned periods are closed history: they take no more writes.
+    days = {as_date(day) for day in days if day is not None}
+    if not days:
+        return
+    periods = closed_periods(model, min(days), max(days))
+    for day in days:
+        name = closed_period(periods, day)
+        if name:
+            raise PeriodClosed(name)
+
+@event.listens_for(db.session, 'before_flush')
+def guard_closed_periods(session, flush_context, instances):
+    days = defaultdict(set)
+    for obj in list(session.new) + list(session.dirty):
+        for model, column in PARTITIONED.values():
+            if isinstance(obj, model):
+                days[model].add(getattr(obj, column))
+    for model, model_days in days.items():
+        check_open_periods(model, model_days)
+
+def attendance_counts(start_date, end_date):
+    # Whole months inside the range come from attendance_rollup; only the
+    # partial months at either edge are counted from raw attendance rows.
+    rollup_from = start_date if start_date.day == 1 else next_month_start(start_date)
+    rollup_to = month_start(end_date + timedelta(days=1))
+    counts = {}
+    if rollup_from >= rollup_to:
+        edges = [(start_date, end_date)]
+    else:
+        edges = [(start_date, rollup_from - timedelta(days=1)), (rollup_to, end_date)]
+        rollups = db.session.query(
+            AttendanceRollup.employee_id, AttendanceRollup.status, func.sum(AttendanceRollup.count)
+        ).filter(
+            AttendanceRollup.month >= rollup_from, AttendanceRollup.month < rollup_to
+        ).group_by(AttendanceRollup.employee_id, AttendanceRollup.status)
+        for employee_id, status, count in rollups:
+            counts[(employee_id, status)] = count
+    for edge_start, edge_end in edges:
+        if edge_start > edge_end:
+            continue
+        if attendance_is_bitmap():
+            count_bitmap_days(counts, edge_start, edge_end)
+            continue
+        # Only the partitions overlapping this edge are read.
+        for source in partition_sources(Attendance, edge_start, edge_end):
+            table = source.table
+            raw = source.execute(
+                select(table.c.employee_id, table.c.status, func.count())
+                .where(table.c.date >= edge_start, table.c.date <= edge_end)
+                .group_by(table.c.employee_id, table.c.status)
+            )
+            for employee_id, status, count in raw:
+                counts[(employee_id, status)] = counts.get((employee_id, status), 0) + count
+    return counts
+
+def encode_cursor(key):
+    key = [value.isoformat() if isinstance(value, date) else value for value in key]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        key = None
+    if not isinstance(key, list) or not key:
+        raise ValueError('Invalid cursor')
+    return key
+
+def page_limit():
+    limit = request.args.get('limit', current_app.config['PAGE_SIZE'], type=int)
+    return max(1, min(limit, current_app.config['MAX_PAGE_SIZE']))
+
+def requested_fields(columns, default=None):
+    fields = request.args.get('fields')
+    if not fields:
+        return list(default or columns)
+    fields = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in columns]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+def parse_date_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f'{name} must be YYYY-MM-DD')
+
+def cursor_values(keys, cursor):
+    after = decode_cursor(cursor)
+    if after is None:
+        return None
+    if len(after) != len(keys):
+        raise ValueError('Invalid cursor')
+    values = []
+    for key, value in zip(keys, after):
+        if isinstance(key.type, db.Date):
+            if not isinstance(value, str):
+                raise ValueError('Invalid cursor')
+            value = date.fromisoformat(value)
+        elif not isinstance(value, (int, str)):
+            raise ValueError('Invalid cursor')
+        values.append(value)
+    return values
+
+def keyset_after(keys, after, descending=False):
+    """Rows strictly past `after` in `keys` order. The leading bound is
+    repeated on its own so the planner can use it as an index range."""
+    clauses = []
+    for i, key in enumerate(keys):
+        past = key < after[i] if descending else key > after[i]
+        clauses.append(and_(*(keys[j] == after[j] for j in range(i)), past))
+    lead = keys[0] <= after[0] if descending else keys[0] >= after[0]
+    return and_(lead, or_(*clauses))
+
+class PageRows:
+    """One page of keyset rows, fetched as the template iterates them.
+
+    Rows carry the key columns first; after iteration `next_cursor` is set
+    when more rows follow, so a pager rendered below the table can use it.
+    """
+
+    def __init__(self, rows, limit, key_size, convert=tuple):
+        self.rows = rows
+        self.limit = limit
+        self.key_size = key_size
+        self.convert = convert
+        self.next_cursor = None
+
+    def __iter__(self):
+        last = None
+        for i, row in enumerate(self.rows):
+            if i == self.limit:
+                self.next_cursor = encode_cursor(last[:self.key_size])
+                break
+            last = row
+            yield self.convert(row[self.key_size:])
+
+def page_url(**changes):
+    args = request.args.to_dict()
+    args.update(changes)
+    return url_for(request.endpoint, **{name: value for name, value in args.items() if value is not None})
+
+def buffered(chunks, size=8192):
+    # stream_template yields a piece per template statement; send them in
+    # larger writes instead of one per table cell.
+    buffer, length = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+def partitioned_page(sources, build, limit, key_size, descending=False):
+    """Up to `limit` + 1 rows of `build(table)` across `sources`, merged in
+    key order. Statements order by their first `key_size` columns, so each
+    source gives at most one page."""
+    results = [source.execute(build(source.table).limit(limit + 1)).all() for source in sources]
+    merged = heapq.merge(*results, key=lambda row: tuple(row[:key_size]), reverse=descending)
+    return list(islice(merged, limit + 1))
+
+def list_view(template, records, model, sorts, default_sort, columns, employee_id=None, convert=tuple):
+    """Stream `template` over one keyset page of `columns` of `model`, read
+    from the live table and its partitions.
+
+    Only sorts backed by an index are offered (each key ends in a unique
+    column), so every page is an index range scan however large the table.
+    """
+    try:
+        sort = request.args.get('sort', default_sort)
+        if sort not in sorts:
+            raise ValueError(f"sort must be one of: {', '.join(sorts)}")
+        order = request.args.get('order', 'asc')
+        if order not in ('asc', 'desc'):
+            raise ValueError("order must be 'asc' or 'desc'")
+        limit = page_limit()
+        keys = sorts[sort]
+        after = cursor_values(keys, request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+    descending = order == 'desc'
+
+    def build(table):
+        table_keys = [table.c[key.name] for key in keys]
+        stmt = select(*table_keys, *(table.c[column.name] for column in columns))
+        if employee_id:
+            stmt = stmt.where(table.c.employee_id == employee_id)
+        if after:
+            stmt = stmt.where(keyset_after(table_keys, after, descending))
+        return stmt.order_by(*(key.desc() if descending else key for key in table_keys))
+
+    rows = partitioned_page(partition_sources(model), build, limit, len(keys), descending)
+    page = PageRows(rows, limit, len(keys), convert)
+    return list_view_response(template, records, page, sorts, sort, order)
+
+def list_view_response(template, records, page, sorts, sort, order):
+    stream = stream_template(template, **{records: page}, sorts=sorts, sort=sort, order=order, page_url=page_url)
+    return Response(buffered(stream), mimetype='text/html')
+
+def include_archived_arg():
+    return request.args.get('include_archived', '').lower() in ('1', 'true', 'yes')
+
+def paginated_response(rows, limit, fields, key_size):
+    # rows carry the keyset columns first, followed by the projected fields;
+    # one extra row beyond limit tells us whether there is a next page.
+    # Dates are left to the JSON provider.
+    page = rows[:limit]
+    response = jsonify([dict(zip(fields, row[key_size:])) for row in page])
+    if len(rows) > limit:
+        response.headers['X-Next-Cursor'] = encode_cursor(page[-1][:key_size])
+    return response, 200
+
+def read_csv_records(stream):
+    reader = csv.DictReader(line.decode('utf-8', 'replace') for line in stream)
+    for record in reader:
+        yield reader.line_num, record
+
+def read_ndjson_records(stream):
+    for line_no, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except ValueError:
+            yield line_no, None
+
+def parse_attendance_record(record, statuses):
+    if not isinstance(record, dict):
+        raise ValueError('Malformed record')
+    try:
+        employee_id = int(record.get('employee_id'))
+    except (TypeError, ValueError):
+        raise ValueError('employee_id must be an integer')
+    try:
+        day = datetime.strptime(str(record.get('date')), '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError('date must be YYYY-MM-DD')
+    status = record.get('status')
+    if status not in statuses:
+        raise ValueError(f'Unknown status: {status}')
+    return (employee_id, day), status
+
+def load_attendance_months(batch):
+    employee_ids = {employee_id for employee_id, _ in batch}
+    months = [month_start(day) for _, day in batch]
+    return {
+        (employee_id, month): days
+        for employee_id, month, days in db.session.query(
+            AttendanceMonth.employee_id, AttendanceMonth.month, AttendanceMonth.days
+        ).filter(
+            AttendanceMonth.employee_id.in_(employee_ids),
+            AttendanceMonth.month >= min(months), AttendanceMonth.month <= max(months),
+        )
+    }
+
+def write_attendance_months(months, rows):
+    patched = {}
+    for row in rows:
+        key = (row['employee_id'], month_start(row['date']))
+        if key not in patched:
+            patched[key] = bytearray(months.get(key) or empty_month(key[1]))
+        patched[key][row['date'].day - 1] = attendance_statuses.code(row['status'])
+    stmt = upsert(AttendanceMonth)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['employee_id', 'month'], set_={'days': stmt.excluded.days}
+    ), [
+        {'employee_id': employee_id, 'month': month, 'days': bytes(days)}
+        for (employee_id, month), days in patched.items()
+    ])
+    record_changes(db.session, [
+        ('attendance_day', row['employee_id'], 'upsert',
+         {'employee_id': row['employee_id'], 'date': row['date'].isoformat(), 'status': row['status']})
+        for row in rows
+    ])
+
+def upsert_attendance_batch(batch, summary):
+    # batch maps (employee_id, date) -> status. Existing rows are read once
+    # so rollup deltas can be derived without a per-row round trip.
+    if attendance_is_bitmap():
+        months = load_attendance_months(batch)
+        status_name = attendance_statuses.name
+        existing = {}
+        for employee_id, day in batch:
+            days = months.get((employee_id, month_start(day)))
+            if days and days[day.day - 1] != UNMARKED:
+                existing[(employee_id, day)] = status_name(days[day.day - 1])
+    else:
+        employee_ids = {employee_id for employee_id, _ in batch}
+        days = [day for _, day in batch]
+        existing = {
+            (employee_id, day): status
+            for employee_id, day, status in db.session.query(
+                Attendance.employee_id, Attendance.date, Attendance.status
+            ).filter(
+                Attendance.employee_id.in_(employee_ids),
+                Attendance.date >= min(days), Attendance.date <= max(days),
+            )
+        }
+    rows = []
+    deltas = Counter()
+    for (employee_id, day), status in batch.items():
+        old_status = existing.get((employee_id, day))
+        if old_status == status:
+            summary['unchanged'] += 1
+            continue
+        if old_status is None:
+            summary['inserted'] += 1
+        else:
+            summary['updated'] += 1
+            deltas[(employee_id, month_start(day), old_status)] -= 1
+        deltas[(employee_id, month_start(day), status)] += 1
+        rows.append({'employee_id': employee_id, 'date': day, 'status': status})
+    if not rows:
+        return
+    if attendance_is_bitmap():
+        write_attendance_months(months, rows)
+    else:
+        stmt = upsert(Attendance)
+        written = db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['employee_id', 'date'], set_={'status': stmt.excluded.status}
+        ).returning(Attendance.id, Attendance.employee_id, Attendance.date, Attendance.status), rows)
+        record_changes(db.session, [
+            ('attendance', id, 'upsert', {'employee_id': employee_id, 'date': day.isoformat(), 'status': status})
+            for id, employee_id, day, status in written
+        ])
+    rollups = [
+        {'employee_id': employee_id, 'month': month, 'status': status, 'count': delta}
+        for (employee_id, month, status), delta in deltas.items() if delta
+    ]
+    if rollups:
+        stmt = upsert(AttendanceRollup)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['employee_id', 'month', 'status'],
+            set_={'count': AttendanceRollup.count + stmt.excluded.count},
+        ), rollups)
+        # A status moved away from entirely leaves a zero count, which a
+        # rebuild would not have; drop it so the two stay identical.
+        db.session.query(AttendanceRollup).filter(
+            AttendanceRollup.employee_id.in_({row['employee_id'] for row in rollups if row['count'] < 0}),
+            AttendanceRollup.count == 0,
+        ).delete(synchronize_session=False)
+    bump_versions([f"attendance:{row['employee_id']}" for row in rows])
+    db.session.commit()
+    invalidate_reports('attendance', {row['date'] for row in rows})
+
+def payroll_run_employee_ids(pay_date, employee_ids=None):
+    # Employees already paid on pay_date are left out so a retried run
+    # never pays anyone twice.
+    query = db.session.query(Employee.id).filter(
+        ~db.session.query(Payroll.id).filter(
+            Payroll.employee_id == Employee.id, Payroll.payment_date == pay_date
+        ).exists()
+    )
+    if employee_ids is None:
+        query = query.filter(
+            Employee.start_date <= pay_date,
+            ~db.session.query(Offboarding.id).filter(
+                Offboarding.employee_id == Employee.id, Offboarding.offboarding_date < pay_date
+            ).exists(),
+        )
+    else:
+        query = query.filter(Employee.id.in_(employee_ids))
+    return [employee_id for employee_id, in query.order_by(Employee.id)]
+
+def last_payroll_cents(employee_ids, before):
+    # Sources are disjoint date ranges, so walking them newest first, an
+    # employee's first hit is their latest pay; older sources are only
+    # asked about employees not found yet.
+    carried = {}
+    for source in reversed(partition_sources(Payroll, None, before)):
+        pending = [employee_id for employee_id in employee_ids if employee_id not in carried]
+        if not pending:
+            break
+        table = source.table
+        latest = select(
+            table.c.employee_id,
+            table.c.amount_cents,
+            func.row_number().over(
+                partition_by=table.c.employee_id,
+                order_by=(table.c.payment_date.desc(), table.c.id.desc()),
+            ).label('position'),
+        ).where(table.c.employee_id.in_(pending), table.c.payment_date < before).subquery()
+        carried.update(source.execute(
+            select(latest.c.employee_id, latest.c.amount_cents).where(latest.c.position == 1)
+        ).all())
+    return carried
+
+def execute_payroll_run(run_id, employee_ids, amounts, amount_cents):
+    # Each batch resolves amounts with one query and writes them with one
+    # executemany; progress is committed with the batch so pollers see it.
+    # An employee's entry in `amounts` wins, then the run's `amount_cents`,
+    # then their last pay; with none of these they are skipped.
+    run = db.session.get(PayrollRun, run_id)
+    try:
+        employee_ids = payroll_run_employee_ids(run.pay_date, employee_ids)
+        with write_gate():
+            run.status = 'running'
+            run.total = len(employee_ids)
+            db.session.commit()
+        batch_size = current_app.config['PAYROLL_RUN_BATCH_SIZE']
+        for offset in range(0, len(employee_ids), batch_size):
+            batch = employee_ids[offset:offset + batch_size]
+            carried = last_payroll_cents(batch, run.pay_date) if amount_cents is None else {}
+            rows = []
+            for employee_id in batch:
+                cents = amounts.get(employee_id, carried.get(employee_id, amount_cents))
+                if cents is None:
+                    run.skipped += 1
+                    continue
+                rows.append({'employee_id': employee_id, 'amount_cents': cents, 'payment_date': run.pay_date})
+            with write_gate():
+                # Re-checked under the lock: a payment made since the run
+                # started (another run, a manual POST) wins.
+                paid = {employee_id for employee_id, in db.session.query(Payroll.employee_id).filter(
+                    Payroll.employee_id.in_([row['employee_id'] for row in rows]), Payroll.payment_date == run.pay_date,
+                )} if rows else set()
+                if paid:
+                    run.skipped += len(paid)
+                    rows = [row for row in rows if row['employee_id'] not in paid]
+                if rows:
+                    ids = db.session.scalars(
+                        insert(Payroll).returning(Payroll.id, sort_by_parameter_order=True), rows
+                    ).all()
+                    record_changes(db.session, [
+                        ('payroll', id, 'insert', {**row, 'payment_date': row['payment_date'].isoformat()})
+                        for id, row in zip(ids, rows)
+                    ])
+                run.processed += len(rows)
+                run.amount_cents += sum(row['amount_cents'] for row in rows)
+                db.session.commit()
+            if rows:
+                invalidate_reports('payroll', [run.pay_date])
+        run.status = 'completed'
+    except Exception as e:
+        db.session.rollback()
+        run.status = 'failed'
+        run.error = str(e)[:500]
+        current_app.logger.exception("Payroll run %s failed", run_id)
+    run.finished_at = datetime.utcnow()
+    with write_gate():
+        db.session.commit()
+
+def run_payroll_in_background(app, run_id, *args):
+    with app.app_context():
+        execute_payroll_run(run_id, *args)
+
+EXPORT_MIMETYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+def export_statements(stmt):
+    # `stmt` may also be a list of (PartitionSource, statement), read in turn.
+    return stmt if isinstance(stmt, list) else [(PartitionSource(None), stmt)]
+
+def export_row_count(stmt):
+    return sum(
+        source.execute(select(func.count()).select_from(statement.order_by(None).subquery())).scalar()
+        for source, statement in export_statements(stmt)
+    )
+
+def export_chunks(fields, stmt, export_format, convert=tuple, expand=None, progress=None):
+    # Rows are pulled from the cursor EXPORT_CHUNK_SIZE at a time and each
+    # chunk is written out before the next is fetched, so memory stays flat
+    # however many rows match. `expand` turns one row into several records;
+    # `progress` is called with the number of rows in each chunk.
+    statements = export_statements(stmt)
+
+    def chunks():
+        chunk_size = current_app.config['EXPORT_CHUNK_SIZE']
+        for source, statement in statements:
+            for rows in source.execute(
+                statement.execution_options(yield_per=chunk_size, stream_results=True)
+            ).partitions():
+                yield rows
+                if progress:
+                    progress(len(rows))
+
+    def records(rows):
+        if expand is None:
+            return (convert(row) for row in rows)
+        return (record for row in rows for record in expand(row))
+
+    def generate_csv():
+        # csv writes dates with str(), which is already ISO 8601.
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+        for rows in chunks():
+            writer.writerows(records(rows))
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+    encode = current_app.json.encode
+
+    def generate_ndjson():
+        for rows in chunks():
+            yield b''.join(encode(dict(zip(fields, record))) + b'\n' for record in records(rows))
+
+    return generate_csv() if export_format == 'csv' else generate_ndjson()
+
+def export_response(name, fields, stmt, export_format, **options):
+    response = Response(
+        stream_with_context(export_chunks(fields, stmt, export_format, **options)),
+        mimetype=EXPORT_MIMETYPES[export_format],
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename={name}.{export_format}'
+    return response
+
+def export_filters(date_column, employee_column):
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'ndjson'):
+        raise ValueError("format must be 'csv' or 'ndjson'")
+    filters = []
+    start_date = parse_date_arg('start_date')
+    end_date = parse_date_arg('end_date')
+    if start_date:
+        filters.append(date_column >= start_date)
+    if end_date:
+        filters.append(date_column <= end_date)
+    employee_id = request.args.get('employee_id')
+    if employee_id:
+        filters.append(employee_column == employee_id)
+    return export_format, filters
+
+def search_employees(terms, limit, offset):
+    if db.engine.dialect.name == 'sqlite':
+        # Every term must match as a prefix of some indexed field. bm25 costs
+        # a pass over every match, so one- and two-letter typeahead prefixes,
+        # which match a large slice of the directory, skip ranking.
+        match = ' '.join(f'"{term}"*' for term in terms)
+        order = 'rank' if max(len(term) for term in terms) > 2 else 'employee_fts.rowid'
+        return db.session.execute(text(
+            "SELECT employee.id, employee.name, employee.email, employee.city, employee.state, employee.zip_code "
+            "FROM employee_fts JOIN employee ON employee.id = employee_fts.rowid "
+            f"WHERE employee_fts MATCH :match ORDER BY {order} LIMIT :limit OFFSET :offset"
+        ), {'match': match, 'limit': limit, 'offset': offset}).all()
+    fields = [Employee.name, Employee.email, Employee.city, Employee.state, Employee.zip_code]
+    query = db.session.query(
+        Employee.id, Employee.name, Employee.email, Employee.city, Employee.state, Employee.zip_code
+    ).filter(*(
+        or_(*(field.ilike(f'{term}%') for field in fields), Employee.name.ilike(f'% {term}%'))
+        for term in terms
+    ))
+    return query.order_by(Employee.name, Employee.id).limit(limit).offset(offset).all()
+
+def identity_key(email):
+    return f'identity:{email}'
+
+def current_identity():
+    """The caller's user, role and permissions, resolved once per token.
+
+    Cached for the request in g and for the process in identity_cache, so
+    authorization checks normally run without touching the database.
+    """
+    if 'identity' in g:
+        return g.identity
+    token_identity = get_jwt_identity()
+    email = token_identity.get('email') if isinstance(token_identity, dict) else None
+    # Batch sub-requests skip the cache: their own writes may have changed
+    # the user, and the invalidation waits for the batch to commit.
+    in_batch = g.get('in_batch')
+    resolved = identity_cache.get(identity_key(email)) if email and not in_batch else None
+    if resolved is None and email:
+        row = db.session.query(
+            User.id, User.username, User.email, User.role_id, Role.name
+        ).outerjoin(User.role).filter(User.email == email).first()
+        if row:
+            resolved = {
+                'user_id': row[0],
+                'username': row[1],
+                'email': row[2],
+                'role_id': row[3],
+                'role': row[4],
+                'permissions': current_app.config['ROLE_PERMISSIONS'].get(row[4], []),
+            }
+            if not in_batch:
+                identity_cache.set(identity_key(email), resolved, current_app.config['IDENTITY_CACHE_TTL'])
+    g.identity = resolved
+    return resolved
+
+def after_batch_commit(fn, *args):
+    """Call fn(*args) now, or, inside a batch sub-request, once the whole
+    batch has committed. Cache invalidations go through here: run before
+    the commit, another request could re-cache the old rows in between."""
+    if g.get('in_batch'):
+        g.batch_deferred.append((fn, args))
+    else:
+        fn(*args)
+
+def invalidate_reports(report, days=None):
+    after_batch_commit(report_cache.invalidate, report, days)
+
+def invalidate_identities(*emails):
+    if emails:
+        after_batch_commit(identity_cache.delete, [identity_key(email) for email in emails])
+    else:
+        after_batch_commit(lambda: identity_cache.delete(identity_cache.keys('identity:')))
+
+WORKFORCE_POSITION = ('start_date', 'state', 'city')
+WORKFORCE_COUNTS = ('hires', 'exits', 'hire_ordinals', 'exit_ordinals')
+
+def as_date(value):
+    return value.date() if isinstance(value, datetime) else value
+
+def committed_value(obj, key):
+    history = inspect(obj).attrs[key].history
+    return history.deleted[0] if history.deleted else getattr(obj, key)
+
+def workforce_hire(deltas, position, sign=1):
+    start_date, state, city = position
+    counts = deltas[(as_date(start_date), state, city)]
+    counts['hires'] += sign
+    counts['hire_ordinals'] += sign * as_date(start_date).toordinal()
+
+def workforce_exit(deltas, position, offboarding_date, sign=1):
+    # People still count on their last day, so the exit lands the day after.
+    start_date, state, city = position
+    counts = deltas[(as_date(offboarding_date) + timedelta(days=1), state, city)]
+    counts['exits'] += sign
+    counts['exit_ordinals'] += sign * as_date(start_date).toordinal()
+
+def write_workforce_events(deltas, connection):
+    rows = [
+        {'day': day, 'state': state, 'city': city, **{field: counts[field] for field in WORKFORCE_COUNTS}}
+        for (day, state, city), counts in deltas.items() if any(counts.values())
+    ]
+    if not rows:
+        return
+    stmt = upsert(WorkforceEvent)
+    connection.execute(stmt.on_conflict_do_update(
+        index_elements=['day', 'state', 'city'],
+        set_={field: getattr(WorkforceEvent, field) + getattr(stmt.excluded, field) for field in WORKFORCE_COUNTS},
+    ), rows)
+    bump_versions(['workforce'], connection)
+
+@event.listens_for(db.session, 'after_flush')
+def track_workforce_timeline(session, flush_context):
+    # ORM writes to employees and offboardings move the timeline in the same
+    # transaction. Core inserts (seed_db.py, imports) bypass this and need
+    # `flask rebuild-workforce-timeline` afterwards.
+    new, dirty, deleted = set(session.new), set(session.dirty), set(session.deleted)
+    employees = {obj.id: obj for obj in new | dirty | deleted if isinstance(obj, Employee)}
+    offboardings = [
+        obj for obj in new | dirty | deleted if isinstance(obj, Offboarding) and (
+            obj not in dirty or any(inspect(obj).attrs[key].history.has_changes()
+                                    for key in ('employee_id', 'offboarding_date'))
+        )
+    ]
+    changed = [
+        obj for obj in employees.values() if obj not in dirty or any(
+            inspect(obj).attrs[key].history.has_changes() for key in WORKFORCE_POSITION
+        )
+    ]
+    if not changed and not offboardings:
+        return
+    connection = session.connection()
+
+    # Offboardings outside this flush follow their employee's move or delete.
+    exits = defaultdict(list)
+    if changed:
+        flushed = [obj.id for obj in offboardings]
+        for employee_id, offboarding_date in connection.execute(
+            select(Offboarding.employee_id, Offboarding.offboarding_date).where(
+                Offboarding.employee_id.in_([obj.id for obj in changed]), Offboarding.id.notin_(flushed)
+            )
+        ):
+            exits[employee_id].append(offboarding_date)
+
+    lookup = {obj.employee_id for obj in offboardings} | {committed_value(obj, 'employee_id') for obj in offboardings}
+    lookup -= employees.keys()
+    stored = {}
+    if lookup:
+        stored = {
+            employee_id: position
+            for employee_id, *position in connection.execute(
+                select(Employee.id, *(getattr(Employee, key) for key in WORKFORCE_POSITION))
+                .where(Employee.id.in_(lookup))
+            )
+        }
+
+    def position(employee_id, old):
+        obj = employees.get(employee_id)
+        if obj is None:
+            return stored.get(employee_id)
+        read = committed_value if old else getattr
+        return tuple(read(obj, key) for key in WORKFORCE_POSITION)
+
+    deltas = defaultdict(Counter)
+    for obj in changed:
+        if obj not in new:
+            old = position(obj.id, old=True)
+            workforce_hire(deltas, old, -1)
+            for offboarding_date in exits[obj.id]:
+                workforce_exit(deltas, old, offboarding_date, -1)
+        if obj not in deleted:
+            current = position(obj.id, old=False)
+            workforce_hire(deltas, current)
+            for offboarding_date in exits[obj.id]:
+                workforce_exit(deltas, current, offboarding_date)
+    for obj in offboardings:
+        if obj not in new:
+            old = position(committed_value(obj, 'employee_id'), old=True)
+            if old:
+                workforce_exit(deltas, old, committed_value(obj, 'offboarding_date'), -1)
+        if obj not in deleted:
+            current = position(obj.employee_id, old=False)
+            if current:
+                workforce_exit(deltas, current, obj.offboarding_date)
+    write_workforce_events(deltas, connection)
+
+def rebuild_workforce_timeline():
+    batch_size = current_app.config['BULK_BATCH_SIZE']
+    deltas = defaultdict(Counter)
+    for position in db.session.execute(
+        select(Employee.start_date, Employee.state, Employee.city).execution_options(yield_per=batch_size)
+    ):
+        workforce_hire(deltas, position)
+    for offboarding_date, *position in db.session.execute(
+        select(Offboarding.offboarding_date, Employee.start_date, Employee.state, Employee.city)
+        .join(Employee, Employee.id == Offboarding.employee_id)
+        .execution_options(yield_per=batch_size)
+    ):
+        workforce_exit(deltas, position, offboarding_date)
+    db.session.query(WorkforceEvent).delete(synchronize_session=False)
+    write_workforce_events(deltas, db.session)
+    db.session.commit()
+
+def workforce_buckets(start_date, end_date, period):
+    """(label, as_of) per bucket; as_of is the last day the bucket covers."""
+    day = start_date
+    while day <= end_date:
+        if period == 'day':
+            yield day, day
+            day += timedelta(days=1)
+        else:
+            following = next_month_start(day)
+            yield day.strftime('%Y-%m'), min(following - timedelta(days=1), end_date)
+            day = following
+
+def workforce_series(start_date, end_date, period, filters):
+    """Running headcount per bucket from the timeline.
+
+    One aggregate gives the totals before start_date and one grouped query
+    the per-bucket deltas, so the work follows the number of buckets rather
+    than the number of employees.
+    """
+    headcount, ordinals = db.session.query(
+        func.coalesce(func.sum(WorkforceEvent.hires - WorkforceEvent.exits), 0),
+        func.coalesce(func.sum(WorkforceEvent.hire_ordinals - WorkforceEvent.exit_ordinals), 0),
+    ).filter(WorkforceEvent.day < start_date, *filters).one()
+    headcount, ordinals = int(headcount), int(ordinals)
+    bucket = WorkforceEvent.day if period == 'day' else period_bucket(WorkforceEvent.day, 'month')
+    deltas = {
+        label: (int(hires), int(exits), int(net_ordinals))
+        for label, hires, exits, net_ordinals in db.session.query(
+            bucket, func.sum(WorkforceEvent.hires), func.sum(WorkforceEvent.exits),
+            func.sum(WorkforceEvent.hire_ordinals - WorkforceEvent.exit_ordinals),
+        ).filter(
+            WorkforceEvent.day >= start_date, WorkforceEvent.day <= end_date, *filters
+        ).group_by(bucket)
+    }
+    series = []
+    for label, as_of in workforce_buckets(start_date, end_date, period):
+        hires, exits, net_ordinals = deltas.get(label, (0, 0, 0))
+        headcount += hires - exits
+        ordinals += net_ordinals
+        series.append({
+            'period': label.isoformat() if isinstance(label, date) else label,
+            'as_of': as_of, 'headcount': headcount, 'hires': hires, 'exits': exits, 'ordinals': ordinals,
+        })
+    return series
+
+def workforce_args():
+    start_date = parse_date_arg('start_date')
+    end_date = parse_date_arg('end_date')
+    if not start_date or not end_date:
+        raise ValueError('start_date and end_date are required')
+    if end_date < start_date:
+        raise ValueError('end_date must not be before start_date')
+    period = request.args.get('period', 'month')
+    if period not in ('day', 'month'):
+        raise ValueError("period must be 'day' or 'month'")
+    if period == 'day' and (end_date - start_date).days >= current_app.config['ANALYTICS_MAX_DAYS']:
+        raise ValueError(f"period=day covers at most {current_app.config['ANALYTICS_MAX_DAYS']} days")
+    filters = [
+        getattr(WorkforceEvent, name) == request.args[name]
+        for name in ('state', 'city') if request.args.get(name)
+    ]
+    return start_date, end_date, period, filters
+
+def archived_attendance_counts(counts, start_date, end_date):
+    archived = db.session.query(
+        AttendanceArchive.employee_id, AttendanceArchive.status, func.count()
+    ).filter(
+        AttendanceArchive.date >= start_date, AttendanceArchive.date <= end_date
+    ).group_by(AttendanceArchive.employee_id, AttendanceArchive.status)
+    for employee_id, status, count in archived:
+        counts[(employee_id, status)] = counts.get((employee_id, status), 0) + count
+    count_bitmap_days(counts, start_date, end_date, AttendanceMonthArchive)
+
+def build_attendance_report(start_date, end_date, include_archived=False):
+    counts = attendance_counts(start_date, end_date)
+    if include_archived:
+        archived_attendance_counts(counts, start_date, end_date)
+    result = {}
+    for (employee_id, status), count in counts.items():
+        if employee_id not in result:
+            result[employee_id] = {'Present': 0, 'Absent': 0}
+        result[employee_id][status] = count
+    return result
+
+def build_payroll_report(start_date, end_date, group_by=None, include_archived=False):
+    totals = {}
+    sources = partition_sources(Payroll, start_date, end_date)
+    if include_archived:
+        sources.append(PartitionSource(PayrollArchive.__table__))
+    for source in sources:
+        table = source.table
+        columns = [table.c.employee_id]
+        if group_by:
+            columns.append(period_bucket(table.c.payment_date, group_by))
+        for *key, cents in source.execute(
+            select(*columns, func.sum(table.c.amount_cents))
+            .where(table.c.payment_date >= start_date, table.c.payment_date <= end_date)
+            .group_by(*columns)
+        ):
+            totals[tuple(key)] = totals.get(tuple(key), 0) + cents
+    result = {}
+    for key, cents in totals.items():
+        amount = cents / 100
+        if group_by:
+            result.setdefault(key[0], {})[key[1]] = amount
+        else:
+            result[key[0]] = amount
+    return result
+
+def rebuild_attendance_rollups():
+    if attendance_is_bitmap():
+        return rebuild_attendance_rollups_from_months()
+    db.session.query(AttendanceRollup).delete(synchronize_session=False)
+    for source in partition_sources(Attendance):
+        table = source.table
+        month = month_bucket(table.c.date)
+        counts = select(table.c.employee_id, month, table.c.status, func.count()).group_by(
+            table.c.employee_id, month, table.c.status
+        )
+        if source.path is None:
+            db.session.execute(insert(AttendanceRollup).from_select(['employee_id', 'month', 'status', 'count'], counts))
+            continue
+        # Detached partitions live in another file; carry the counts over.
+        rows = [
+            {'employee_id': employee_id, 'month': date.fromisoformat(str(month)[:10]), 'status': status, 'count': count}
+            for employee_id, month, status, count in source.execute(counts)
+        ]
+        if rows:
+            db.session.execute(insert(AttendanceRollup), rows)
+    db.session.commit()
+    invalidate_reports('attendance')
+
+def rebuild_attendance_rollups_from_months():
+    status_name = attendance_statuses.name
+    db.session.query(AttendanceRollup).delete(synchronize_session=False)
+    batch_size = current_app.config['BULK_BATCH_SIZE']
+    rows = []
+    months = db.session.execute(
+        select(AttendanceMonth.employee_id, AttendanceMonth.month, AttendanceMonth.days)
+        .execution_options(yield_per=batch_size)
+    )
+    for employee_id, month, days in months:
+        for code, count in count_codes(days).items():
+            rows.append({'employee_id': employee_id, 'month': month, 'status': status_name(code), 'count': count})
+        if len(rows) >= batch_size:
+            db.session.execute(insert(AttendanceRollup), rows)
+            rows = []
+    if rows:
+        db.session.execute(insert(AttendanceRollup), rows)
+    db.session.commit()
+    invalidate_reports('attendance')
+
+def pack_attendance():
+    """Fill attendance_month from the attendance rows (bitmap storage)."""
+    db.session.query(AttendanceMonth).delete(synchronize_session=False)
+    batch_size = current_app.config['BULK_BATCH_SIZE']
+    codes = {}
+    packed = []
+    current_key, current = None, None
+    rows = db.session.execute(
+        select(Attendance.employee_id, Attendance.date, Attendance.status)
+        .order_by(Attendance.employee_id, Attendance.date)
+        .execution_options(yield_per=batch_size)
+    )
+    total = 0
+    for employee_id, day, status in rows:
+        key = (employee_id, month_start(day))
+        if key != current_key:
+            if current_key:
+                packed.append({'employee_id': current_key[0], 'month': current_key[1], 'days': bytes(current)})
+            current_key, current = key, bytearray(empty_month(key[1]))
+        if status not in codes:
+            codes[status] = attendance_statuses.code(status)
+        current[day.day - 1] = codes[status]
+        total += 1
+        if len(packed) >= batch_size:
+            db.session.execute(insert(AttendanceMonth), packed)
+            packed = []
+    if current_key:
+        packed.append({'employee_id': current_key[0], 'month': current_key[1], 'days': bytes(current)})
+    if packed:
+        db.session.execute(insert(AttendanceMonth), packed)
+    db.session.commit()
+    return total
+
+@api.cli.command('pack-attendance')
+def pack_attendance_command():
+    """Convert attendance rows to packed months for ATTENDANCE_STORAGE=bitmap."""
+    with write_gate():
+        total = pack_attendance()
+    print(f"Packed {total} attendance rows into attendance_month.")
+
+@api.cli.command('rebuild-attendance-rollups')
+def rebuild_attendance_rollups_command():
+    """Recompute attendance_rollup from the raw attendance table."""
+    rebuild_attendance_rollups()
+    print("Attendance rollups rebuilt.")
+
+@api.cli.command('rebuild-workforce-timeline')
+def rebuild_workforce_timeline_command():
+    """Recompute workforce_event from the employee and offboarding tables."""
+    with write_gate():
+        rebuild_workforce_timeline()
+    print("Workforce timeline rebuilt.")
+
+def archive_employee_history(employee_ids):
+    """Move the attendance and payroll of `employee_ids` into the archive
+    tables, one INSERT ... SELECT and one DELETE per table and chunk.
+
+    Only the attendance store in use is moved, from the live table and any
+    partitions still in the database; detached partition files are
+    read-only and keep their rows, and their months keep their attendance
+    rollups. Rollups of the moved months are dropped; reports read archived
+    history straight from the archive tables when asked to. Each deleted
+    row is logged as a change. Runs in the caller's transaction and returns
+    the number of rows moved per table.
+    """
+    if attendance_is_bitmap():
+        tables = [(AttendanceMonth, AttendanceMonthArchive), (Payroll, PayrollArchive)]
+        detached = []
+    else:
+        tables = [(Attendance, AttendanceArchive), (Payroll, PayrollArchive)]
+        detached = db.session.query(DataPartition.period_start, DataPartition.period_end).filter(
+            DataPartition.base == Attendance.__tablename__, DataPartition.path.isnot(None)
+        ).all()
+    moved = {}
+    batch_size = current_app.config['BULK_BATCH_SIZE']
+    for live, archive in tables:
+        columns = [column.name for column in live.__table__.columns]
+        moved[live.__tablename__] = 0
+        for source in partition_sources(live):
+            if source.path is not None:
+                continue
+            table = source.table
+            deleted = 0
+            for i in range(0, len(employee_ids), batch_size):
+                chunk = employee_ids[i:i + batch_size]
+                db.session.execute(insert(archive).from_select(
+                    columns, select(*table.columns).where(table.c.employee_id.in_(chunk))
+                ))
+                if live is AttendanceMonth:
+                    # Packed months are keyed by employee and month, not id.
+                    changes = [
+                        ('attendance_month', employee_id, 'delete', {'employee_id': employee_id, 'month': month.isoformat()})
+                        for employee_id, month in db.session.execute(
+                            delete(table).where(table.c.employee_id.in_(chunk))
+                            .returning(table.c.employee_id, table.c.month)
+                        )
+                    ]
+                else:
+                    changes = [
+                        (CHANGE_ENTITIES[live], id, 'delete', None)
+                        for id in db.session.scalars(
+                            delete(table).where(table.c.employee_id.in_(chunk)).returning(table.c.id)
+                        )
+                    ]
+                record_changes(db.session, changes)
+                deleted += len(changes)
+            if deleted and table is not live.__table__:
+                db.session.query(DataPartition).filter(DataPartition.name == table.name).update(
+                    {DataPartition.rows: DataPartition.rows - deleted}, synchronize_session=False
+                )
+            moved[live.__tablename__] += deleted
+    for i in range(0, len(employee_ids), batch_size):
+        db.session.query(AttendanceRollup).filter(
+            AttendanceRollup.employee_id.in_(employee_ids[i:i + batch_size]),
+            *(~and_(AttendanceRollup.month >= start, AttendanceRollup.month < end) for start, end in detached),
+        ).delete(synchronize_session=False)
+    bump_versions([f'attendance:{employee_id}' for employee_id in employee_ids])
+    return moved
+
+@api.cli.command('archive-offboarded')
+@click.option('--days', default=730, show_default=True, help='archive employees who left more than this many days ago')
+def archive_offboarded_command(days):
+    """Move the history of long-departed employees to the archive tables."""
+    cutoff = date.today() - timedelta(days=days)
+    batch_size = current_app.config['BULK_BATCH_SIZE']
+    pending = db.session.query(Offboarding.id, Offboarding.employee_id).filter(
+        Offboarding.archived_at.is_(None), Offboarding.offboarding_date < cutoff
+    ).order_by(Offboarding.id).all()
+    totals = Counter()
+    for i in range(0, len(pending), batch_size):
+        batch = pending[i:i + batch_size]
+        with write_gate():
+            totals.update(archive_employee_history(sorted({employee_id for _, employee_id in batch})))
+            now = datetime.utcnow()
+            offboarding_ids = [offboarding_id for offboarding_id, _ in batch]
+            db.session.query(Offboarding).filter(Offboarding.id.in_(offboarding_ids)).update(
+                {Offboarding.archived_at: now}, synchronize_session=False
+            )
+            record_changes(db.session, [
+                ('offboarding', offboarding_id, 'update', {'archived_at': now.isoformat()})
+                for offboarding_id in offboarding_ids
+            ])
+            bump_versions([f'offboarding:{offboarding_id}' for offboarding_id in offboarding_ids])
+            db.session.commit()
+    if pending:
+        invalidate_reports('attendance')
+        invalidate_reports('payroll')
+    print(f"Archived {len(pending)} offboardings: " + ', '.join(f'{count} {table}' for table, count in sorted(totals.items())))
+
+def split_partitions(model, period, before):
+    """Move whole `period`s of `model` rows dated before `before` out of the
+    live table into one partition table each. Returns {name: rows moved}."""
+    live = model.__table__
+    column = live.c[PARTITIONED[model.__tablename__][1]]
+    # Only finished periods close; the current one keeps taking writes.
+    before = min(period_start(before, period), period_start(date.today(), period))
+    first = db.session.query(func.min(column)).scalar()
+    moved = {}
+    day = period_start(first, period) if first else before
+    while day < before:
+        end = next_period(day, period)
+        in_period = and_(column >= day, column < end)
+        if db.session.query(select(live).where(in_period).exists()).scalar():
+            name = partition_name(model.__tablename__, day, period)
+            table = partition_table(live, name)
+            with write_gate():
+                table.create(db.session.connection(), checkfirst=True)
+                db.session.execute(insert(table).from_select([c.name for c in live.columns], select(live).where(in_period)))
+                moved[name] = db.session.execute(delete(live).where(in_period)).rowcount
+                partition = DataPartition.query.filter_by(name=name).first()
+                if partition is None:
+                    partition = DataPartition(
+                        base=model.__tablename__, name=name, period=period, period_start=day, period_end=end, rows=0,
+                    )
+                    db.session.add(partition)
+                partition.rows += moved[name]
+                db.session.commit()
+        day = end
+    return moved
+
+def copy_rows(table, source, target, batch_size):
+    copied = 0
+    for rows in source.execute(select(table).execution_options(yield_per=batch_size, stream_results=True)).partitions():
+        target.execute(insert(table), [row._asdict() for row in rows])
+        copied += len(rows)
+    return copied
+
+@api.cli.command('partition-history')
+@click.option('--table', 'base', type=click.Choice(sorted(PARTITIONED)), required=True)
+@click.option('--period', type=click.Choice(PERIODS), default='year', show_default=True)
+@click.option('--before', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='split periods that end by this date (default: all finished periods)')
+def partition_history_command(base, period, before):
+    """Split closed periods of attendance or payroll into partition tables."""
+    if base == 'attendance' and attendance_is_bitmap():
+        raise click.ClickException('Packed attendance (ATTENDANCE_STORAGE=bitmap) is not partitioned.')
+    moved = split_partitions(PARTITIONED[base][0], period, (before or datetime.now()).date())
+    for name, rows in moved.items():
+        print(f"{name}: {rows} rows")
+    print(f"Split {sum(moved.values())} {base} rows into {len(moved)} partitions.")
+
+@api.cli.command('detach-partition')
+@click.argument('name')
+def detach_partition_command(name):
+    """Move a partition table into its own read-only SQLite file."""
+    if not is_sqlite():
+        raise click.ClickException('Detaching partitions needs a SQLite database.')
+    partition = DataPartition.query.filter_by(name=name).first()
+    if partition is None or partition.path:
+        raise click.ClickException(f'{name} is not a partition in this database.')
+    table = partition_table(PARTITIONED[partition.base][0].__table__, name)
+    os.makedirs(current_app.config['PARTITION_DIR'], exist_ok=True)
+    path = os.path.join(current_app.config['PARTITION_DIR'], f'{name}.db')
+    if os.path.exists(path):
+        raise click.ClickException(f'{path} already exists.')
+    engine = create_engine(f'sqlite:///{path}')
+    with engine.begin() as target:
+        table.create(target)
+        copied = copy_rows(table, PartitionSource(table), target, current_app.config['BULK_BATCH_SIZE'])
+    engine.dispose()
+    if copied != partition.rows:
+        os.remove(path)
+        raise click.ClickException(f'Copied {copied} rows but {name} should hold {partition.rows}; left in place.')
+    os.chmod(path, 0o444)
+    with write_gate():
+        partition.path = path
+        table.drop(db.session.connection())
+        db.session.commit()
+    print(f"Detached {name} ({copied} rows) to {path}.")
+
+@api.cli.command('attach-partition')
+@click.argument('name')
+def attach_partition_command(name):
+    """Copy a detached partition file back into the database."""
+    partition = DataPartition.query.filter_by(name=name).first()
+    if partition is None or not partition.path:
+        raise click.ClickException(f'{name} is not a detached partition.')
+    table = partition_table(PARTITIONED[partition.base][0].__table__, name)
+    with write_gate():
+        table.create(db.session.connection())
+        copied = copy_rows(table, PartitionSource(table, partition.path), db.session, current_app.config['BULK_BATCH_SIZE'])
+        path, partition.path = partition.path, None
+        db.session.commit()
+    partition_engines.dispose(path)
+    print(f"Attached {name} ({copied} rows); {path} can be removed.")
+
+@api.cli.command('prune-changes')
+@click.option('--days', default=30, show_default=True, help='keep this many days of changes')
+def prune_changes_command(days):
+    """Delete old change log entries; clients behind the cut must resync."""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    last_pruned = db.session.query(func.max(ChangeLog.id)).filter(ChangeLog.created_at < cutoff).scalar()
+    if last_pruned is not None:
+        # Keep the newest entry so databases created without AUTOINCREMENT
+        # can't reuse pruned ids, which would sit behind every cursor.
+        last_pruned = min(last_pruned, db.session.query(func.max(ChangeLog.id)).scalar() - 1)
+    if not last_pruned:
+        print("Nothing to prune.")
+        return
+    with write_gate():
+        deleted = db.session.query(ChangeLog).filter(ChangeLog.id <= last_pruned).delete(synchronize_session=False)
+        watermark = upsert(ResourceVersion)
+        db.session.execute(watermark.on_conflict_do_update(
+            index_elements=['key'], set_={'version': watermark.excluded.version, 'updated_at': watermark.excluded.updated_at},
+        ), {'key': 'change_log:pruned', 'version': last_pruned, 'updated_at': datetime.utcnow()})
+        db.session.commit()
+    print(f"Pruned {deleted} changes up to id {last_pruned}.")
+
+@api.route('/register', methods=['POST'])
 def register():
     data = request.get_json()
     if not data:
@@ -115,6 +1675,8 @@ def register():
 
     if not username or not email or not password or not role_id:
         return jsonify({'message': 'Missing fields'}), 400
+    if not isinstance(password, str):
+        return jsonify({'message': 'password must be a string'}), 400
 
     user = User.query.filter_by(username=username).first()
     if user:
@@ -124,59 +1686,104 @@ def register():
     if user:
         return jsonify({'message': 'Email already exists'}), 400
 
+    try:
+        password = password_hasher.hash(password)
+    except HashQueueFull:
+        return busy_response()
+
     new_user = User(
         username=username,
         email=email,
         password=password,
         role_id=role_id
     )
-    db.session.add(new_user)
-    db.session.commit()
+    try:
+        with write_gate():
+            db.session.add(new_user)
+            db.session.commit()
+    except WriteQueueFull:
+        return busy_response("Too many concurrent writes, retry shortly")
 
     return jsonify({'message': 'User registered successfully'}), 201
 
-@app.route('/login', methods=['POST'])
+@api.route('/login', methods=['POST'])
 def login():
-    data = request.get_json()
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'message': 'No input data provided'}), 400
     email = data.get('email')
     password = data.get('password')
+    if not email or not password:
+        return jsonify({'message': 'Invalid email or password'}), 401
+    if not isinstance(email, str) or not isinstance(password, str):
+        return jsonify({'message': 'email and password must be strings'}), 400
 
-    user = User.query.filter_by(email=email, password=password).first()
+    retry_after = max(login_ip_limiter.hit(request.remote_addr), login_account_limiter.hit(email.lower()))
+    if retry_after:
+        return busy_response("Too many login attempts", retry_after, 429)
 
-    if not user:
+    user = User.query.filter_by(email=email).first()
+    try:
+        matches, needs_rehash = password_hasher.verify(password, user.password if user else None)
+        if matches and needs_rehash:
+            new_hash = password_hasher.hash(password)
+    except HashQueueFull:
+        return busy_response()
+
+    if not matches:
         return jsonify({'message': 'Invalid email or password'}), 401
 
+    login_account_limiter.reset(email.lower())
+    if needs_rehash:
+        # Best effort: a busy write queue shouldn't fail the login, the row
+        # is migrated on a later one.
+        try:
+            with write_gate():
+                user.password = new_hash
+                db.session.commit()
+        except WriteQueueFull:
+            db.session.rollback()
+
     access_token = create_access_token(identity={'email': user.email, 'role_id': user.role_id})
-    return jsonify({'message': 'Login successful', 'access_token': access_token}), 200
+    response = jsonify({'message': 'Login successful', 'access_token': access_token})
+    set_access_cookies(response, access_token)
+    return response, 200
 
-@app.route('/protected', methods=['GET'])
+@api.route('/logout', methods=['POST'])
+def logout():
+    response = jsonify({'message': 'Logged out'})
+    unset_jwt_cookies(response)
+    return response, 200
+
+@api.route('/protected', methods=['GET'])
 @jwt_required()
 def protected():
     current_user = get_jwt_identity()
     return jsonify(logged_in_as=current_user), 200
 
-@app.route('/admin', methods=['GET'])
+@api.route('/admin', methods=['GET'])
 @jwt_required()
 def admin():
-    current_user_id = get_jwt_identity()
-    current_user = User.query.get(current_user_id)
-    if current_user.role.name != 'Admin':
+    identity = current_identity()
+    if not identity or identity['role'] != 'Admin':
         return jsonify({"msg": "Admins only!"}), 403
     return jsonify({"msg": "Welcome, Admin!"}), 200
 
-@app.route('/employee/<int:id>', methods=['PUT'])
+@api.route('/employee/<int:id>', methods=['PUT'])
 @jwt_required()
 def update_employee(id):
     data = request.get_json()
     employee = User.query.get(id)
     if not employee:
         return jsonify({"msg": "Employee not found"}), 404
+    old_email = employee.email
     employee.username = data['username']
     employee.email = data['email']
     db.session.commit()
+    invalidate_identities(old_email, employee.email)
     return jsonify({"msg": "Employee updated successfully"}), 200
 
-@app.route('/employee/<int:id>', methods=['DELETE'])
+@api.route('/employee/<int:id>', methods=['DELETE'])
 @jwt_required()
 def delete_employee(id):
     employee = User.query.get(id)
@@ -184,9 +1791,10 @@ def delete_employee(id):
         return jsonify({"msg": "Employee not found"}), 404
     db.session.delete(employee)
     db.session.commit()
+    invalidate_identities(employee.email)
     return jsonify({"msg": "Employee deleted successfully"}), 200
 
-@app.route('/role', methods=['POST'])
+@api.route('/role', methods=['POST'])
 @jwt_required()
 def create_role():
     data = request.get_json()
@@ -197,7 +1805,7 @@ def create_role():
     db.session.commit()
     return jsonify({"msg": "Role created successfully"}), 201
 
-@app.route('/role/<int:role_id>', methods=['PUT'])
+@api.route('/role/<int:role_id>', methods=['PUT'])
 @jwt_required()
 def update_role(role_id):
     role = Role.query.get_or_404(role_id)
@@ -205,9 +1813,10 @@ def update_role(role_id):
     if 'name' in data:
         role.name = data['name']
     db.session.commit()
+    invalidate_identities()
     return jsonify({'message': 'Role updated successfully!'})
 
-@app.route('/role/<int:id>', methods=['DELETE'])
+@api.route('/role/<int:id>', methods=['DELETE'])
 @jwt_required()
 def delete_role(id):
     role = Role.query.get(id)
@@ -215,30 +1824,35 @@ def delete_role(id):
         return jsonify({"msg": "Role not found"}), 404
     db.session.delete(role)
     db.session.commit()
+    invalidate_identities()
     return jsonify({"msg": "Role deleted successfully"}), 200
 
-@app.route('/payroll', methods=['POST'])
+@api.route('/payroll', methods=['POST'])
 @jwt_required()
 def create_payroll():
     data = request.get_json()
-    new_payroll = Payroll(employee_id=data['employee_id'], amount=data['amount'], payment_date=datetime.strptime(data['payment_date'], '%Y-%m-%d'))
+    new_payroll = Payroll(employee_id=data['employee_id'], amount=data['amount'], payment_date=datetime.strptime(data['payment_date'], '%Y-%m-%d').date())
     db.session.add(new_payroll)
     db.session.commit()
+    invalidate_reports('payroll', [new_payroll.payment_date])
     return jsonify({"msg": "Payroll created successfully"}), 201
 
-@app.route('/payroll/<int:id>', methods=['PUT'])
+@api.route('/payroll/<int:id>', methods=['PUT'])
 @jwt_required()
 def update_payroll(id):
     data = request.get_json()
     payroll = Payroll.query.get(id)
     if not payroll:
         return jsonify({"msg": "Payroll record not found"}), 404
+    touched = [payroll.payment_date]
     payroll.amount = data['amount']
-    payroll.payment_date = datetime.strptime(data['payment_date'], '%Y-%m-%d')
+    payroll.payment_date = datetime.strptime(data['payment_date'], '%Y-%m-%d').date()
+    touched.append(payroll.payment_date)
     db.session.commit()
+    invalidate_reports('payroll', touched)
     return jsonify({"msg": "Payroll updated successfully"}), 200
 
-@app.route('/payroll/<int:id>', methods=['DELETE'])
+@api.route('/payroll/<int:id>', methods=['DELETE'])
 @jwt_required()
 def delete_payroll(id):
     payroll = Payroll.query.get(id)
@@ -246,68 +1860,663 @@ def delete_payroll(id):
         return jsonify({"msg": "Payroll record not found"}), 404
     db.session.delete(payroll)
     db.session.commit()
+    invalidate_reports('payroll', [payroll.payment_date])
     return jsonify({"msg": "Payroll deleted successfully"}), 200
 
-@app.route('/attendance', methods=['POST'])
+@api.route('/payroll/run', methods=['POST'])
 @jwt_required()
-def mark_attendance():
+def create_payroll_run():
+    """Pay everyone due on pay_date in a background run.
+
+    {"pay_date": "2026-10-30", "amount": 5000, "amounts": {"7": 6000}, "employee_ids": [...]}
+
+    `amounts` sets pay per employee and `amount` for everyone else; without
+    either, each employee gets their last pay and the never-paid are skipped.
+    """
     data = request.get_json()
-    new_attendance = Attendance(employee_id=data['employee_id'], date=datetime.strptime(data['date'], '%Y-%m-%d'), status=data['status'])
-    db.session.add(new_attendance)
+    try:
+        pay_date = datetime.strptime(data['pay_date'], '%Y-%m-%d').date()
+        employee_ids = data.get('employee_ids')
+        if employee_ids is not None:
+            employee_ids = [int(employee_id) for employee_id in employee_ids]
+        amounts = data.get('amounts') or {}
+        if not isinstance(amounts, dict):
+            raise TypeError('amounts must be an object')
+        amounts = {int(employee_id): to_cents(amount) for employee_id, amount in amounts.items()}
+        amount_cents = to_cents(data['amount']) if data.get('amount') is not None else None
+    except (KeyError, TypeError, ValueError, ArithmeticError):
+        return jsonify({"msg": "Invalid payroll run request"}), 400
+    check_open_periods(Payroll, [pay_date])
+    # Checked and created under the request's write lock, so two POSTs for
+    # one date can't both start.
+    active = db.session.query(PayrollRun.id).filter(
+        PayrollRun.pay_date == pay_date, PayrollRun.status.in_(('queued', 'running'))
+    ).limit(1).scalar()
+    if active:
+        return jsonify({"msg": f"Payroll run {active} for {pay_date} is still in progress", "run_id": active}), 409
+    run = PayrollRun(pay_date=pay_date)
+    db.session.add(run)
     db.session.commit()
+    payroll_run_executor.submit(
+        run_payroll_in_background, current_app._get_current_object(), run.id, employee_ids, amounts, amount_cents
+    )
+    return jsonify({"msg": "Payroll run started", "run_id": run.id}), 202
+
+@api.route('/payroll/run/<int:id>', methods=['GET'])
+@jwt_required()
+def get_payroll_run(id):
+    run = PayrollRun.query.get(id)
+    if not run:
+        return jsonify({"msg": "Payroll run not found"}), 404
+    result = {
+        "id": run.id,
+        "pay_date": run.pay_date,
+        "status": run.status,
+        "total": run.total,
+        "processed": run.processed,
+        "skipped": run.skipped,
+        "amount": run.amount_cents / 100,
+        "error": run.error
+    }
+    return jsonify(result), 200
+
+@api.route('/attendance', methods=['POST'])
+@jwt_required()
+def mark_attendance():
+    data = request.get_json()
+    statuses = current_app.config['ATTENDANCE_STATUSES']
+    if data.get('status') not in statuses:
+        return jsonify({"msg": f"status must be one of: {', '.join(statuses)}"}), 400
+    if attendance_is_bitmap():
+        day = datetime.strptime(data['date'], '%Y-%m-%d').date()
+        try:
+            marked = mark_attendance_day(data['employee_id'], day, data['status'])
+            if marked:
+                bump_attendance_rollup(data['employee_id'], day, data['status'])
+                db.session.commit()
+        except IntegrityError:
+            marked = False
+        if not marked:
+            db.session.rollback()
+            return jsonify({"msg": "Attendance already marked for this date"}), 409
+        invalidate_reports('attendance', [day])
+        return jsonify({"msg": "Attendance marked successfully"}), 201
+    new_attendance = Attendance(employee_id=data['employee_id'], date=datetime.strptime(data['date'], '%Y-%m-%d').date(), status=data['status'])
+    try:
+        db.session.add(new_attendance)
+        bump_attendance_rollup(new_attendance.employee_id, new_attendance.date, new_attendance.status)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"msg": "Attendance already marked for this date"}), 409
+    invalidate_reports('attendance', [new_attendance.date])
     return jsonify({"msg": "Attendance marked successfully"}), 201
 
-@app.route('/attendance', methods=['GET'])
+@api.route('/attendance/bulk', methods=['POST'])
+@jwt_required()
+def bulk_attendance():
+    if request.mimetype == 'text/csv':
+        records = read_csv_records(request.stream)
+    elif request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        records = read_ndjson_records(request.stream)
+    else:
+        return jsonify({"msg": "Send text/csv or application/x-ndjson"}), 415
+    statuses = set(current_app.config['ATTENDANCE_STATUSES'])
+    batch_size = current_app.config['BULK_BATCH_SIZE']
+    summary = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'errors': []}
+    closed = closed_periods(Attendance)
+    batch = {}
+    for line_no, record in records:
+        try:
+            key, status = parse_attendance_record(record, statuses)
+            partition = closed_period(closed, key[1])
+            if partition:
+                raise ValueError(f'{partition} is a closed partition')
+        except ValueError as e:
+            summary['errors'].append({'line': line_no, 'error': str(e)})
+            continue
+        batch[key] = status
+        if len(batch) >= batch_size:
+            upsert_attendance_batch(batch, summary)
+            batch = {}
+    if batch:
+        upsert_attendance_batch(batch, summary)
+    return jsonify(summary), 200
+
+@api.route('/attendance', methods=['GET'])
 @jwt_required()
 def view_attendance():
+    columns = {'id': Attendance.id, 'employee_id': Attendance.employee_id, 'date': Attendance.date, 'status': Attendance.status}
+    if attendance_is_bitmap():
+        del columns['id']
+    try:
+        fields = requested_fields(columns, default=['date', 'status'])
+        limit = page_limit()
+        keys = [AttendanceMonth.month] if attendance_is_bitmap() else [Attendance.date, Attendance.id]
+        after = cursor_values(keys, request.args.get('cursor'))
+        start_date = parse_date_arg('start_date')
+        end_date = parse_date_arg('end_date')
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
     employee_id = request.args.get('employee_id')
-    attendance_records = Attendance.query.filter_by(employee_id=employee_id).all()
-    result = [{"date": record.date.strftime('%Y-%m-%d'), "status": record.status} for record in attendance_records]
-    return jsonify(result), 200
+    etag, last_modified, not_modified = check_not_modified(
+        [f'attendance:{employee_id}'], request.query_string.decode()
+    )
+    if not_modified:
+        return not_modified
+    if attendance_is_bitmap():
+        rows = attendance_month_page(employee_id, fields, start_date, end_date, after, limit)
+        response, status = paginated_response(rows, limit, fields, key_size=1)
+        return with_validators(response, etag, last_modified), status
+    after_date = after[0] if after else None
+
+    def build(table):
+        stmt = select(
+            table.c.date, table.c.id, *(table.c[field] for field in fields)
+        ).where(table.c.employee_id == employee_id)
+        if start_date:
+            stmt = stmt.where(table.c.date >= start_date)
+        if end_date:
+            stmt = stmt.where(table.c.date <= end_date)
+        if after:
+            stmt = stmt.where(or_(
+                table.c.date > after_date,
+                and_(table.c.date == after_date, table.c.id > after[1]),
+            ))
+        return stmt.order_by(table.c.date, table.c.id)
+
+    sources = partition_sources(Attendance, max(filter(None, [start_date, after_date]), default=None), end_date)
+    rows = partitioned_page(sources, build, limit, key_size=2)
+    response, status = paginated_response(rows, limit, fields, key_size=2)
+    return with_validators(response, etag, last_modified), status
+
+def attendance_month_page(employee_id, fields, start_date, end_date, after, limit):
+    # Keyset rows shaped like the row-store query: (date, *fields), cursor
+    # on date alone since a packed month holds one status per day. `after`
+    # is the parsed cursor, as cursor_values([AttendanceMonth.month], ...)
+    # returns it.
+    if after:
+        after_date = after[0] + timedelta(days=1)
+        start_date = max(start_date, after_date) if start_date else after_date
+    query = db.session.query(AttendanceMonth.month, AttendanceMonth.days).filter(
+        AttendanceMonth.employee_id == employee_id
+    )
+    if start_date:
+        query = query.filter(AttendanceMonth.month >= month_start(start_date))
+    if end_date:
+        query = query.filter(AttendanceMonth.month <= end_date)
+    status_name = attendance_statuses.name
+    rows = []
+    for month, days in query.order_by(AttendanceMonth.month).yield_per(12):
+        lo, hi = day_range(month, start_date, end_date)
+        for day, code in marked_days(month, days, lo, hi):
+            values = {'employee_id': int(employee_id), 'date': day, 'status': status_name(code)}
+            rows.append((day, *(values[field] for field in fields)))
+            if len(rows) > limit:
+                return rows
+    return rows
+
+@api.route('/attendance/view', methods=['GET'])
+@jwt_required()
+def attendance_view():
+    """Attendance as a paginated, sortable HTML table."""
+    employee_id = request.args.get('employee_id', type=int)
+    if attendance_is_bitmap():
+        return attendance_month_view(employee_id)
+    sorts = {
+        'date': (Attendance.date, Attendance.employee_id),
+        'employee_id': (Attendance.employee_id, Attendance.date),
+        'id': (Attendance.id,),
+    }
+    return list_view(
+        'attendance.html', 'attendance_records', Attendance, sorts, 'date',
+        [Attendance.id, Attendance.employee_id, Attendance.date, Attendance.status], employee_id,
+    )
+
+def attendance_month_view(employee_id):
+    # Packed months are keyed per employee, so the view is one employee's
+    # days in date order.
+    if not employee_id:
+        return jsonify({"msg": "employee_id is required"}), 400
+    try:
+        limit = page_limit()
+        after = cursor_values([AttendanceMonth.month], request.args.get('cursor'))
+        rows = attendance_month_page(employee_id, ['employee_id', 'date', 'status'], None, None, after, limit)
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+    page = PageRows(rows, limit, 1, lambda row: ('', *row))
+    return list_view_response('attendance.html', 'attendance_records', page, {'date': None}, 'date', 'asc')
+
+@api.route('/payroll/view', methods=['GET'])
+@jwt_required()
+def payroll_view():
+    """Payroll as a paginated, sortable HTML table."""
+    employee_id = request.args.get('employee_id', type=int)
+    sorts = {
+        'payment_date': (Payroll.payment_date, Payroll.employee_id, Payroll.id),
+        'employee_id': (Payroll.employee_id, Payroll.payment_date, Payroll.id),
+        'id': (Payroll.id,),
+    }
+    return list_view(
+        'payroll.html', 'payroll_records', Payroll, sorts, 'payment_date',
+        [Payroll.id, Payroll.employee_id, Payroll.payment_date, Payroll.amount_cents], employee_id,
+        lambda row: (row[0], row[1], row[2].month, row[2].year, f'{Decimal(row[3]) / 100:.2f}'),
+    )
 
-@app.route('/attendance/report', methods=['GET'])
+@api.route('/attendance/calendar', methods=['GET'])
+@jwt_required()
+def attendance_calendar():
+    """One employee-month as a list of statuses, null where unmarked."""
+    try:
+        employee_id = int(request.args['employee_id'])
+        month = datetime.strptime(request.args['month'], '%Y-%m').date()
+    except (KeyError, ValueError):
+        return jsonify({"msg": "employee_id and month=YYYY-MM are required"}), 400
+    etag, last_modified, not_modified = check_not_modified(
+        [f'attendance:{employee_id}'], request.query_string.decode()
+    )
+    if not_modified:
+        return not_modified
+    if attendance_is_bitmap():
+        days = db.session.query(AttendanceMonth.days).filter_by(employee_id=employee_id, month=month).scalar()
+        days = days or empty_month(month)
+        status_name = attendance_statuses.name
+        statuses = [status_name(code) if code != UNMARKED else None for code in days]
+    else:
+        statuses = [None] * len(empty_month(month))
+        month_end = next_month_start(month) - timedelta(days=1)
+        for source in partition_sources(Attendance, month, month_end):
+            table = source.table
+            for day, status in source.execute(select(table.c.date, table.c.status).where(
+                table.c.employee_id == employee_id, table.c.date >= month, table.c.date <= month_end,
+            )):
+                statuses[day.day - 1] = status
+    result = {"employee_id": employee_id, "month": month.strftime('%Y-%m'), "days": statuses}
+    return with_validators(jsonify(result), etag, last_modified), 200
+
+def report_dates():
+    start_date = parse_date_arg('start_date')
+    end_date = parse_date_arg('end_date')
+    if not start_date or not end_date:
+        raise ValueError('start_date and end_date are required')
+    return start_date, end_date
+
+def attendance_report_args():
+    start_date, end_date = report_dates()
+    return dict(start_date=start_date, end_date=end_date, include_archived=include_archived_arg())
+
+def attendance_report_result(start_date, end_date, include_archived):
+    return report_cache.get_or_compute(
+        'attendance', start_date, end_date, {'include_archived': include_archived},
+        lambda: build_attendance_report(start_date, end_date, include_archived), cached=not g.get('in_batch'),
+    )
+
+@api.route('/attendance/report', methods=['GET'])
 @jwt_required()
 def attendance_report():
-    start_date = datetime.strptime(request.args.get('start_date'), '%Y-%m-%d')
-    end_date = datetime.strptime(request.args.get('end_date'), '%Y-%m-%d')
-    attendance_records = Attendance.query.filter(Attendance.date >= start_date, Attendance.date <= end_date).all()
-    result = {}
-    for record in attendance_records:
-        if record.employee_id not in result:
-            result[record.employee_id] = {'Present': 0, 'Absent': 0}
-        result[record.employee_id][record.status] += 1
-    return jsonify(result), 200
+    try:
+        args = attendance_report_args()
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+    return jsonify(attendance_report_result(**args)), 200
 
-@app.route('/payroll/report', methods=['GET'])
+def payroll_report_args():
+    start_date, end_date = report_dates()
+    group_by = request.args.get('group_by')
+    if group_by not in (None, 'month', 'year'):
+        raise ValueError("group_by must be 'month' or 'year'")
+    return dict(start_date=start_date, end_date=end_date, group_by=group_by, include_archived=include_archived_arg())
+
+def payroll_report_result(start_date, end_date, group_by, include_archived):
+    return report_cache.get_or_compute(
+        'payroll', start_date, end_date, {'group_by': group_by, 'include_archived': include_archived},
+        lambda: build_payroll_report(start_date, end_date, group_by, include_archived), cached=not g.get('in_batch'),
+    )
+
+@api.route('/payroll/report', methods=['GET'])
 @jwt_required()
 def payroll_report():
-    start_date = datetime.strptime(request.args.get('start_date'), '%Y-%m-%d')
-    end_date = datetime.strptime(request.args.get('end_date'), '%Y-%m-%d')
-    payroll_records = Payroll.query.filter(Payroll.payment_date >= start_date, Payroll.payment_date <= end_date).all()
-    result = {}
-    for record in payroll_records:
-        if record.employee_id not in result:
-            result[record.employee_id] = 0
-        result[record.employee_id] += record.amount
-    return jsonify(result), 200
+    try:
+        args = payroll_report_args()
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+    return jsonify(payroll_report_result(**args)), 200
+
+@api.route('/analytics/headcount', methods=['GET'])
+@jwt_required()
+def headcount_analytics():
+    """Headcount at the end of each day or month, with the hires and exits in it."""
+    try:
+        start_date, end_date, period, filters = workforce_args()
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+    etag, last_modified, not_modified = check_not_modified(['workforce'], request.query_string.decode())
+    if not_modified:
+        return not_modified
+    result = [
+        {"period": row['period'], "headcount": row['headcount'], "hires": row['hires'], "exits": row['exits']}
+        for row in workforce_series(start_date, end_date, period, filters)
+    ]
+    return with_validators(jsonify(result), etag, last_modified), 200
+
+@api.route('/analytics/tenure', methods=['GET'])
+@jwt_required()
+def tenure_analytics():
+    """Average tenure of the people employed at the end of each day or month."""
+    try:
+        start_date, end_date, period, filters = workforce_args()
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+    etag, last_modified, not_modified = check_not_modified(['workforce'], request.query_string.decode())
+    if not_modified:
+        return not_modified
+    result = []
+    for row in workforce_series(start_date, end_date, period, filters):
+        days = None
+        if row['headcount'] > 0:
+            days = row['as_of'].toordinal() - row['ordinals'] / row['headcount']
+        result.append({
+            "period": row['period'],
+            "headcount": row['headcount'],
+            "average_tenure_days": round(days, 1) if days is not None else None,
+            "average_tenure_years": round(days / 365.25, 2) if days is not None else None,
+        })
+    return with_validators(jsonify(result), etag, last_modified), 200
+
+@api.route('/reports/cache', methods=['GET'])
+@jwt_required()
+def report_cache_stats():
+    return jsonify(report_cache.stats()), 200
+
+@api.route('/attendance/export', methods=['GET'])
+@jwt_required()
+def export_attendance():
+    try:
+        export = attendance_export()
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+    return export_response(**export)
+
+def attendance_export():
+    """export_response() arguments for the attendance export in request.args."""
+    if attendance_is_bitmap():
+        return attendance_months_export()
+    export_format, _ = export_filters(Attendance.date, Attendance.employee_id)
+    sources = partition_sources(Attendance, parse_date_arg('start_date'), parse_date_arg('end_date'))
+    statements = []
+    for source in sources:
+        table = source.table
+        _, filters = export_filters(table.c.date, table.c.employee_id)
+        statements.append((source, select(
+            table.c.id, table.c.employee_id, table.c.date, table.c.status
+        ).where(*filters).order_by(table.c.date, table.c.id)))
+    return dict(name='attendance', fields=['id', 'employee_id', 'date', 'status'], stmt=statements,
+                export_format=export_format)
+
+def attendance_months_export():
+    # Packed months carry no row ids; records come out month by month,
+    # employee by employee.
+    export_format, _ = export_filters(AttendanceMonth.month, AttendanceMonth.employee_id)
+    start_date = parse_date_arg('start_date')
+    end_date = parse_date_arg('end_date')
+    stmt = select(AttendanceMonth.employee_id, AttendanceMonth.month, AttendanceMonth.days)
+    if start_date:
+        stmt = stmt.where(AttendanceMonth.month >= month_start(start_date))
+    if end_date:
+        stmt = stmt.where(AttendanceMonth.month <= end_date)
+    if request.args.get('employee_id'):
+        stmt = stmt.where(AttendanceMonth.employee_id == request.args.get('employee_id'))
+    status_name = attendance_statuses.name
+
+    def expand(row):
+        employee_id, month, days = row
+        lo, hi = day_range(month, start_date, end_date)
+        return [(employee_id, day, status_name(code)) for day, code in marked_days(month, days, lo, hi)]
+
+    stmt = stmt.order_by(AttendanceMonth.month, AttendanceMonth.employee_id)
+    return dict(name='attendance', fields=['employee_id', 'date', 'status'], stmt=stmt,
+                export_format=export_format, expand=expand)
+
+@api.route('/payroll/export', methods=['GET'])
+@jwt_required()
+def export_payroll():
+    try:
+        export = payroll_export()
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+    return export_response(**export)
+
+def payroll_export():
+    """export_response() arguments for the payroll export in request.args."""
+    export_format, _ = export_filters(Payroll.payment_date, Payroll.employee_id)
+    sources = partition_sources(Payroll, parse_date_arg('start_date'), parse_date_arg('end_date'))
+    statements = []
+    for source in sources:
+        table = source.table
+        _, filters = export_filters(table.c.payment_date, table.c.employee_id)
+        statements.append((source, select(
+            table.c.id, table.c.employee_id, table.c.payment_date, table.c.amount_cents
+        ).where(*filters).order_by(table.c.payment_date, table.c.id)))
+    return dict(
+        name='payroll', fields=['id', 'employee_id', 'payment_date', 'amount'], stmt=statements,
+        export_format=export_format, convert=lambda row: (row[0], row[1], row[2], Decimal(row[3]).scaleb(-2)),
+    )
+
+def report_job(compute):
+    def run(job, **args):
+        job.progress(0, 1, force=True)
+        report = compute(**args)
+        job.progress(1, force=True)
+        return {'report': report}
+    return run
+
+def export_job(job, name, fields, stmt, export_format, **options):
+    # Written beside the final name and renamed when complete, so a result
+    # file is never partial.
+    directory = current_app.config['JOB_RESULT_DIR']
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'job-{job.id}.{export_format}')
+    job.progress(0, export_row_count(stmt), force=True)
+    try:
+        with open(path + '.part', 'wb') as f:
+            for chunk in export_chunks(fields, stmt, export_format, progress=job.advance, **options):
+                f.write(chunk.encode() if isinstance(chunk, str) else chunk)
+        os.replace(path + '.part', path)
+    finally:
+        if os.path.exists(path + '.part'):
+            os.remove(path + '.part')
+    job.progress(force=True)
+    return {'file': path, 'filename': f'{name}.{export_format}', 'mimetype': EXPORT_MIMETYPES[export_format]}
+
+# type -> (parse request.args into arguments, run the job with them). Jobs
+# take the same query arguments as their synchronous routes.
+JOB_TYPES = {
+    'attendance_report': (attendance_report_args, report_job(attendance_report_result)),
+    'payroll_report': (payroll_report_args, report_job(payroll_report_result)),
+    'attendance_export': (attendance_export, export_job),
+    'payroll_export': (payroll_export, export_job),
+}
+
+def run_job(app, job):
+    prepare, run = JOB_TYPES[job.type]
+    with app.test_request_context(query_string=job.params):
+        return run(job, **prepare())
+
+job_backend = TableBackend(Job.__table__, lambda: db.engine, write_gate)
+job_runner = JobRunner(job_backend, run_job)
 
-@app.route('/users', methods=['GET'])
+def start_job_workers(workers=None):
+    config = current_app.config
+    return job_runner.start(
+        current_app._get_current_object(), config['JOB_WORKERS'] if workers is None else workers,
+        config['JOB_CONCURRENCY'], config['JOB_POLL_INTERVAL'], config['JOB_PROGRESS_INTERVAL'],
+        config['JOB_STALE_SECONDS'],
+    )
+
+def job_owner():
+    identity = get_jwt_identity()
+    return identity.get('email') if isinstance(identity, dict) else str(identity)
+
+def owned_job(id):
+    job = job_backend.get(id)
+    return job if job and job['owner'] == job_owner() else None
+
+def job_status(job):
+    return {
+        "id": job['id'],
+        "type": job['type'],
+        "params": job['params'],
+        "status": job['status'],
+        "done": job['done'],
+        "total": job['total'],
+        "progress": round(job['done'] / job['total'], 4) if job['total'] else None,
+        "cancel_requested": job['cancel_requested'],
+        "error": job['error'],
+        "created_at": job['created_at'],
+        "started_at": job['started_at'],
+        "finished_at": job['finished_at'],
+        "result_url": url_for('api.get_job_result', id=job['id']) if job['status'] == 'completed' else None,
+    }
+
+@api.route('/jobs', methods=['POST'])
+@jwt_required()
+def submit_job():
+    """Queue a report or export to run in the background.
+
+    {"type": "payroll_export", "params": {"start_date": "2020-01-01", "format": "csv"}}
+    returns 202 and the job id; poll GET /jobs/<id> and fetch the output from
+    GET /jobs/<id>/result.
+    """
+    data = request.get_json(silent=True) or {}
+    job_type = data.get('type')
+    params = data.get('params') or {}
+    if job_type not in JOB_TYPES:
+        return jsonify({"msg": f"type must be one of: {', '.join(JOB_TYPES)}"}), 400
+    if not isinstance(params, dict) or any(isinstance(value, (dict, list)) for value in params.values()):
+        return jsonify({"msg": "params must be an object of query arguments"}), 400
+    params = {str(name): str(value).lower() if isinstance(value, bool) else str(value) for name, value in params.items()}
+    try:
+        # Parse now so a bad argument is a 400 here, not a failed job later.
+        with current_app.test_request_context(query_string=params):
+            JOB_TYPES[job_type][0]()
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+    job_id = job_backend.submit(job_type, params, job_owner())
+    start_job_workers()
+    job_runner.notify()
+    response = jsonify({"msg": "Job queued", "job_id": job_id})
+    response.headers['Location'] = url_for('api.get_job', id=job_id)
+    return response, 202
+
+@api.route('/jobs/<int:id>', methods=['GET'])
+@jwt_required()
+def get_job(id):
+    job = owned_job(id)
+    if not job:
+        return jsonify({"msg": "Job not found"}), 404
+    if job['status'] == 'queued':
+        start_job_workers()
+    return jsonify(job_status(job)), 200
+
+@api.route('/jobs/<int:id>', methods=['DELETE'])
+@jwt_required()
+def cancel_job(id):
+    """Cancel a queued job, or stop a running one at its next progress report."""
+    job = owned_job(id)
+    if not job:
+        return jsonify({"msg": "Job not found"}), 404
+    if job['status'] in FINISHED:
+        return jsonify({"msg": f"Job already {job['status']}"}), 409
+    job_backend.cancel(id)
+    return jsonify(job_status(job_backend.get(id))), 202
+
+@api.route('/jobs/<int:id>/result', methods=['GET'])
+@jwt_required()
+def get_job_result(id):
+    job = owned_job(id)
+    if not job:
+        return jsonify({"msg": "Job not found"}), 404
+    if job['status'] != 'completed':
+        return jsonify({"msg": f"Job is {job['status']}"}), 409
+    result = job['result']
+    if 'file' not in result:
+        return jsonify(result['report']), 200
+    if not os.path.exists(result['file']):
+        return jsonify({"msg": "Job result has expired"}), 410
+    return send_file(result['file'], mimetype=result['mimetype'], as_attachment=True, download_name=result['filename'])
+
+@api.cli.command('job-worker')
+@click.option('--workers', default=2, show_default=True, help='jobs to run at once in this process')
+def job_worker_command(workers):
+    """Run queued jobs in the foreground until interrupted."""
+    threads = start_job_workers(workers)
+    print(f"Running jobs on {len(threads)} threads.")
+    for thread in threads:
+        thread.join()
+
+@api.cli.command('prune-jobs')
+@click.option('--days', default=7, show_default=True, help='keep finished jobs and their results this many days')
+def prune_jobs_command(days):
+    """Delete finished jobs and their result files."""
+    results = job_backend.prune(datetime.utcnow() - timedelta(days=days))
+    for result in results:
+        if result and 'file' in result and os.path.exists(result['file']):
+            os.remove(result['file'])
+    print(f"Pruned {len(results)} jobs.")
+
+@api.route('/employees/search', methods=['GET'])
+@jwt_required()
+def employee_search():
+    terms = re.findall(r'\w+', request.args.get('q', '').lower())
+    if not terms:
+        return jsonify({"msg": "q is required"}), 400
+    try:
+        limit = page_limit()
+        after = decode_cursor(request.args.get('cursor'))
+        offset = int(after[0]) if after else 0
+    except (TypeError, ValueError) as e:
+        return jsonify({"msg": str(e) or 'Invalid cursor'}), 400
+    rows = search_employees(terms, limit + 1, offset)
+    fields = ['id', 'name', 'email', 'city', 'state', 'zip_code']
+    response = jsonify([dict(zip(fields, row)) for row in rows[:limit]])
+    if len(rows) > limit:
+        response.headers['X-Next-Cursor'] = encode_cursor([offset + limit])
+    return response, 200
+
+@api.route('/users', methods=['GET'])
 @jwt_required()
 def get_users():
-    users = User.query.all()
-    result = [{"id": user.id, "username": user.username, "email": user.email, "role_id": user.role_id} for user in users]
-    return jsonify(result), 200
+    columns = {'id': User.id, 'username': User.username, 'email': User.email, 'role_id': User.role_id}
+    try:
+        fields = requested_fields(columns)
+        limit = page_limit()
+        after = cursor_values([User.id], request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+    etag, last_modified, not_modified = check_not_modified(['users'], request.query_string.decode())
+    if not_modified:
+        return not_modified
+    query = db.session.query(User.id, *(columns[field] for field in fields))
+    if after:
+        query = query.filter(User.id > after[0])
+    rows = query.order_by(User.id).limit(limit + 1).all()
+    response, status = paginated_response(rows, limit, fields, key_size=1)
+    return with_validators(response, etag, last_modified), status
 
-@app.route('/users/<int:id>', methods=['GET'])
+@api.route('/users/<int:id>', methods=['GET'])
 @jwt_required()
 def get_user(id):
-    user = User.query.get(id)
+    etag, last_modified, not_modified = check_not_modified([f'user:{id}'])
+    if not_modified:
+        return not_modified
+    user = db.session.execute(
+        select(User.id, User.username, User.email, User.role_id).where(User.id == id)
+    ).first()
     if not user:
         return jsonify({"message": "User not found"}), 404
-    result = {"id": user.id, "username": user.username, "email": user.email, "role_id": user.role_id}
-    return jsonify(result), 200
+    return with_validators(jsonify(user._asdict()), etag, last_modified), 200
 
-@app.route('/users/<int:id>', methods=['PUT'])
+@api.route('/users/<int:id>', methods=['PUT'])
 @jwt_required()
 def update_user(id):
     data = request.get_json()
@@ -315,14 +2524,16 @@ def update_user(id):
     if not user:
         return jsonify({"message": "User not found"}), 404
 
+    old_email = user.email
     user.username = data.get('username', user.username)
     user.email = data.get('email', user.email)
     user.role_id = data.get('role_id', user.role_id)
 
     db.session.commit()
+    invalidate_identities(old_email, user.email)
     return jsonify({"message": "User updated successfully"}), 200
 
-@app.route('/users/<int:id>', methods=['DELETE'])
+@api.route('/users/<int:id>', methods=['DELETE'])
 @jwt_required()
 def delete_user(id):
     user = User.query.get(id)
@@ -331,16 +2542,17 @@ def delete_user(id):
 
     db.session.delete(user)
     db.session.commit()
+    invalidate_identities(user.email)
     return jsonify({"message": "User deleted successfully"}), 200
 
-@app.route('/onboarding', methods=['POST'])
+@api.route('/onboarding', methods=['POST'])
 @jwt_required()
 def create_onboarding():
     data = request.get_json()
     new_onboarding = Onboarding(
         employee_id=data['employee_id'],
-        start_date=datetime.strptime(data['start_date'], '%Y-%m-%d'),
-        end_date=datetime.strptime(data['end_date'], '%Y-%m-%d'),
+        start_date=datetime.strptime(data['start_date'], '%Y-%m-%d').date(),
+        end_date=datetime.strptime(data['end_date'], '%Y-%m-%d').date(),
         documents_submitted=data['documents_submitted'],
         training_completed=data['training_completed'],
         status=data['status']
@@ -349,22 +2561,22 @@ def create_onboarding():
     db.session.commit()
     return jsonify({"msg": "Onboarding created successfully"}), 201
 
-@app.route('/onboarding/<int:id>', methods=['PUT'])
+@api.route('/onboarding/<int:id>', methods=['PUT'])
 @jwt_required()
 def update_onboarding(id):
     data = request.get_json()
     onboarding = Onboarding.query.get(id)
     if not onboarding:
         return jsonify({"msg": "Onboarding record not found"}), 404
-    onboarding.start_date = datetime.strptime(data['start_date'], '%Y-%m-%d')
-    onboarding.end_date = datetime.strptime(data['end_date'], '%Y-%m-%d')
+    onboarding.start_date = datetime.strptime(data['start_date'], '%Y-%m-%d').date()
+    onboarding.end_date = datetime.strptime(data['end_date'], '%Y-%m-%d').date()
     onboarding.documents_submitted = data['documents_submitted']
     onboarding.training_completed = data['training_completed']
     onboarding.status = data['status']
     db.session.commit()
     return jsonify({"msg": "Onboarding updated successfully"}), 200
 
-@app.route('/onboarding/<int:id>', methods=['DELETE'])
+@api.route('/onboarding/<int:id>', methods=['DELETE'])
 @jwt_required()
 def delete_onboarding(id):
     onboarding = Onboarding.query.get(id)
@@ -374,32 +2586,32 @@ def delete_onboarding(id):
     db.session.commit()
     return jsonify({"msg": "Onboarding deleted successfully"}), 200
 
-@app.route('/offboarding', methods=['POST'])
+@api.route('/offboarding', methods=['POST'])
 @jwt_required()
 def create_offboarding():
     data = request.get_json()
     new_offboarding = Offboarding(
         employee_id=data['employee_id'],
-        offboarding_date=datetime.strptime(data['offboarding_date'], '%Y-%m-%d'),
+        offboarding_date=datetime.strptime(data['offboarding_date'], '%Y-%m-%d').date(),
         reason=data['reason']
     )
     db.session.add(new_offboarding)
     db.session.commit()
     return jsonify({"msg": "Offboarding created successfully"}), 201
 
-@app.route('/offboarding/<int:id>', methods=['PUT'])
+@api.route('/offboarding/<int:id>', methods=['PUT'])
 @jwt_required()
 def update_offboarding(id):
     data = request.get_json()
     offboarding = Offboarding.query.get(id)
     if not offboarding:
         return jsonify({"msg": "Offboarding record not found"}), 404
-    offboarding.offboarding_date = datetime.strptime(data['offboarding_date'], '%Y-%m-%d')
+    offboarding.offboarding_date = datetime.strptime(data['offboarding_date'], '%Y-%m-%d').date()
     offboarding.reason = data['reason']
     db.session.commit()
     return jsonify({"msg": "Offboarding updated successfully"}), 200
 
-@app.route('/offboarding/<int:id>', methods=['DELETE'])
+@api.route('/offboarding/<int:id>', methods=['DELETE'])
 @jwt_required()
 def delete_offboarding(id):
     offboarding = Offboarding.query.get(id)
@@ -409,35 +2621,215 @@ def delete_offboarding(id):
     db.session.commit()
     return jsonify({"msg": "Offboarding deleted successfully"}), 200
 
-@app.route('/onboarding/<int:id>', methods=['GET'])
+@api.route('/offboarding/<int:id>/finalize', methods=['POST'])
+@jwt_required()
+def finalize_offboarding(id):
+    """Archive the departed employee's attendance and payroll history."""
+    offboarding = Offboarding.query.get(id)
+    if not offboarding:
+        return jsonify({"msg": "Offboarding record not found"}), 404
+    if offboarding.archived_at:
+        return jsonify({"msg": "Offboarding already finalized"}), 409
+    if offboarding.offboarding_date >= date.today():
+        return jsonify({"msg": "Employee has not left yet"}), 409
+    archived = archive_employee_history([offboarding.employee_id])
+    offboarding.archived_at = datetime.utcnow()
+    db.session.commit()
+    invalidate_reports('attendance')
+    invalidate_reports('payroll')
+    return jsonify({"msg": "Offboarding finalized", "archived": archived}), 200
+
+@api.route('/onboarding/<int:id>', methods=['GET'])
 @jwt_required()
 def get_onboarding(id):
-    onboarding = Onboarding.query.get(id)
+    etag, last_modified, not_modified = check_not_modified([f'onboarding:{id}'])
+    if not_modified:
+        return not_modified
+    onboarding = db.session.execute(select(
+        Onboarding.employee_id, Onboarding.start_date, Onboarding.end_date,
+        Onboarding.documents_submitted, Onboarding.training_completed, Onboarding.status,
+    ).where(Onboarding.id == id)).first()
     if not onboarding:
         return jsonify({"msg": "Onboarding record not found"}), 404
-    result = {
-        "employee_id": onboarding.employee_id,
-        "start_date": onboarding.start_date.strftime('%Y-%m-%d'),
-        "end_date": onboarding.end_date.strftime('%Y-%m-%d'),
-        "documents_submitted": onboarding.documents_submitted,
-        "training_completed": onboarding.training_completed,
-        "status": onboarding.status
-    }
-    return jsonify(result), 200
+    return with_validators(jsonify(onboarding._asdict()), etag, last_modified), 200
 
-@app.route('/offboarding/<int:id>', methods=['GET'])
+@api.route('/offboarding/<int:id>', methods=['GET'])
 @jwt_required()
 def get_offboarding(id):
-    offboarding = Offboarding.query.get(id)
+    etag, last_modified, not_modified = check_not_modified([f'offboarding:{id}'])
+    if not_modified:
+        return not_modified
+    offboarding = db.session.execute(select(
+        Offboarding.employee_id, Offboarding.offboarding_date, Offboarding.reason, Offboarding.archived_at,
+    ).where(Offboarding.id == id)).first()
     if not offboarding:
         return jsonify({"msg": "Offboarding record not found"}), 404
-    result = {
-        "employee_id": offboarding.employee_id,
-        "offboarding_date": offboarding.offboarding_date.strftime('%Y-%m-%d'),
-        "reason": offboarding.reason
+    return with_validators(jsonify(offboarding._asdict()), etag, last_modified), 200
+
+@api.route('/changes', methods=['GET'])
+@jwt_required()
+def changes():
+    """Change log entries after the `since` cursor, oldest first.
+
+    wait=<seconds> long-polls until something changes. A cursor older than
+    the pruned part of the log gets 410 and the client must resync.
+    """
+    try:
+        since = decode_cursor(request.args.get('since'))
+        since = int(since[0]) if since else 0
+        wait = max(0.0, min(float(request.args.get('wait', 0)), current_app.config['CHANGES_MAX_WAIT']))
+    except (TypeError, ValueError):
+        return jsonify({"msg": "Invalid since or wait"}), 400
+    entities = request.args.get('entities')
+    if entities:
+        entities = [entity.strip() for entity in entities.split(',') if entity.strip()]
+        unknown = set(entities) - set(CHANGE_ENTITIES.values()) - set(PACKED_CHANGE_ENTITIES)
+        if unknown:
+            return jsonify({"msg": f"Unknown entities: {', '.join(sorted(unknown))}"}), 400
+    limit = page_limit()
+
+    pruned = db.session.query(ResourceVersion.version).filter_by(key='change_log:pruned').scalar() or 0
+    if since < pruned:
+        return jsonify({"msg": "Cursor is older than the change log, resync required"}), 410
+
+    query = db.session.query(
+        ChangeLog.id, ChangeLog.entity, ChangeLog.entity_id, ChangeLog.op, ChangeLog.data,
+        ChangeLog.created_at.label('at'),
+    ).filter(ChangeLog.id > since)
+    if entities:
+        query = query.filter(ChangeLog.entity.in_(entities))
+    query = query.order_by(ChangeLog.id).limit(limit + 1)
+
+    deadline = time.monotonic() + wait
+    while True:
+        rows = query.all()
+        remaining = deadline - time.monotonic()
+        if rows or remaining <= 0:
+            break
+        # End the read transaction so the next poll sees new commits; commits
+        # in this worker wake us early, other workers within a poll interval.
+        db.session.rollback()
+        with change_feed:
+            change_feed.wait(min(remaining, current_app.config['CHANGES_POLL_INTERVAL']))
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    cursor = encode_cursor([rows[-1].id if rows else since])
+    response = jsonify({
+        "changes": [row._asdict() for row in rows],
+        "cursor": cursor,
+        "has_more": has_more,
+    })
+    response.headers['X-Next-Cursor'] = cursor
+    return response, 200
+
+# Sub-requests that hand work to other threads, write through their own
+# connection outside the batch transaction, or would recurse.
+BATCH_EXCLUDED_ENDPOINTS = {'api.batch', 'api.create_payroll_run', 'api.submit_job', 'api.cancel_job'}
+
+class BatchSession(db.session.session_factory.class_):
+    """Session pinned to the batch connection; Flask-SQLAlchemy's get_bind
+    would otherwise route every model back to the engine."""
+
+    def get_bind(self, *args, **kwargs):
+        return self.bind
+
+def dispatch_batch_item(connection, item, headers, deferred):
+    method = str(item.get('method', 'GET')).upper()
+    path = item.get('path')
+    if not isinstance(path, str) or not path.startswith('/'):
+        return {"status": 400, "body": {"msg": "Each request needs a path"}}
+    adapter = current_app.url_map.bind('localhost')
+    try:
+        endpoint, _ = adapter.match(path.split('?', 1)[0], method=method)
+    except Exception:
+        endpoint = None
+    if endpoint in BATCH_EXCLUDED_ENDPOINTS:
+        return {"status": 400, "body": {"msg": f"{method} {path} is not allowed in a batch"}}
+
+    # A fresh app context gives the sub-request its own g; the scoped
+    # session for that context is the batch session, whose commits only
+    # release a savepoint inside the batch transaction. What it reads may
+    # never commit, so g.in_batch keeps it out of the process-wide caches,
+    # and its cache invalidations wait in `deferred` for the batch commit.
+    app = current_app._get_current_object()
+    with app.app_context():
+        g.in_batch = True
+        g.batch_deferred = deferred
+        db.session.registry.set(BatchSession(db, bind=connection, join_transaction_mode='create_savepoint'))
+        with app.test_request_context(path, method=method, json=item.get('body'), headers=headers):
+            response = app.full_dispatch_request()
+            body = response.get_data(as_text=True)
+    result = {"status": response.status_code}
+    if response.is_json:
+        result["body"] = json.loads(body) if body else None
+    elif body:
+        result["body"] = body
+    return result
+
+@api.route('/batch', methods=['POST'])
+@jwt_required()
+def batch():
+    """Run an ordered list of sub-requests in one database transaction.
+
+    {"atomic": true, "requests": [{"method": "PUT", "path": "/users/1", "body": {...}}, ...]}
+
+    Atomic batches stop at the first failing item (status >= 400) and roll
+    everything back. Otherwise each item is rolled back on its own and the
+    rest commit.
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get('requests')
+    atomic = bool(data.get('atomic', True))
+    if not isinstance(items, list) or not items:
+        return jsonify({"msg": "requests must be a non-empty list"}), 400
+    if len(items) > current_app.config['BATCH_MAX_REQUESTS']:
+        return jsonify({"msg": f"At most {current_app.config['BATCH_MAX_REQUESTS']} requests per batch"}), 400
+
+    headers = {
+        name: request.headers[name] for name in ('Authorization', 'Cookie', 'X-CSRF-TOKEN') if name in request.headers
     }
-    return jsonify(result), 200
+    results = []
+    failed = False
+    deferred = []
+    with db.engine.connect() as connection:
+        transaction = connection.begin()
+        if is_sqlite():
+            # pysqlite defers BEGIN until the first DML; without it the first
+            # SAVEPOINT would open the transaction and its RELEASE commit it.
+            connection.exec_driver_sql('BEGIN')
+        try:
+            for item in items:
+                savepoint = connection.begin_nested()
+                item_deferred = []
+                result = dispatch_batch_item(connection, item if isinstance(item, dict) else {}, headers, item_deferred)
+                results.append(result)
+                if result['status'] >= 400:
+                    savepoint.rollback()
+                    if atomic:
+                        failed = True
+                        break
+                else:
+                    savepoint.commit()
+                    deferred.extend(item_deferred)
+        except BaseException:
+            transaction.rollback()
+            raise
+        if failed:
+            transaction.rollback()
+        else:
+            transaction.commit()
+            for fn, args in deferred:
+                fn(*args)
+    return jsonify({"committed": not failed, "results": results}), 200
+
+def __getattr__(name):
+    # `app:app` (gunicorn, App Service's default startup, `flask --app app`)
+    # keeps working, while importing this module for its helpers builds nothing.
+    if name == 'app':
+        globals()['app'] = create_app()
+        return globals()['app']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == '__main__':
-    app.config['DEBUG'] = os.environ.get('FLASK_DEBUG', 'False') == 'True'  # Enable debug mode based on environment variable
-    app.run()
+    create_app().run()
@@ -0,0 +1,93 @@
+"""Packed attendance months: one byte per day, dictionary-encoded.
+
+Byte i of a month holds the status code for day i + 1; 0 means nothing was
+recorded. Codes map to status names through StatusDictionary, so a month is
+at most 31 bytes however verbose the status names are.
+"""
+import calendar
+import threading
+from datetime import timedelta
+
+UNMARKED = 0
+MAX_CODE = 255
+
+
+def days_in_month(month):
+    return calendar.monthrange(month.year, month.month)[1]
+
+
+def empty_month(month):
+    return bytes(days_in_month(month))
+
+
+def with_day(days, day, code):
+    i = day.day - 1
+    return days[:i] + bytes((code,)) + days[i + 1:]
+
+
+def day_range(month, start=None, end=None):
+    """Slice bounds of `days` covering [start, end] within `month`."""
+    lo = (start - month).days if start and start > month else 0
+    hi = days_in_month(month)
+    if end is not None:
+        hi = min(hi, (end - month).days + 1)
+    return lo, max(lo, hi)
+
+
+def count_codes(days):
+    # bytes.count runs in C; a month has at most a handful of distinct codes.
+    return {code: days.count(code) for code in set(days) if code != UNMARKED}
+
+
+def marked_days(month, days, lo=0, hi=None):
+    for i, code in enumerate(days[lo:hi], lo):
+        if code != UNMARKED:
+            yield month + timedelta(days=i), code
+
+
+class StatusDictionary:
+    """Status name <-> code map shared by the process.
+
+    `load()` returns {name: code} from the database; `create(name)` persists
+    a new name and returns its code. The map is reloaded on any miss, so
+    codes assigned by other workers are picked up on first use.
+    """
+
+    def __init__(self, load, create):
+        self._load = load
+        self._create = create
+        self._codes = {}
+        self._names = {}
+        self._lock = threading.Lock()
+
+    def code(self, name, create=True):
+        code = self._codes.get(name)
+        if code is None:
+            self.reload()
+            code = self._codes.get(name)
+        if code is None and create:
+            code = self._create(name)
+        return code
+
+    def name(self, code):
+        name = self._names.get(code)
+        if name is None:
+            self.reload()
+            name = self._names.get(code)
+        return name
+
+    def names(self):
+        if not self._names:
+            self.reload()
+        return dict(self._names)
+
+    def reload(self):
+        codes = self._load()
+        with self._lock:
+            self._codes = dict(codes)
+            self._names = {code: name for name, code in codes.items()}
+
+    def reset(self):
+        with self._lock:
+            self._codes = {}
+            self._names = {}
@@ -0,0 +1,213 @@
+"""Latency/throughput benchmark for the HRMS routes.
+
+Drives each scenario through the Flask test client (default) or a running
+server (--url), prints p50/p99 latency and throughput, and compares them with
+a stored baseline:
+
+    python seed_db.py --employees 10000 --days 365
+    python benchmark.py --save-baseline bench_baseline.json
+    python benchmark.py --baseline bench_baseline.json   # exits 1 on regression
+
+--startup N also boots the app N times in fresh interpreters and reports
+the time to a ready app and to the first served request.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import date, timedelta
+
+from flask_jwt_extended import create_access_token
+
+from app import create_app, report_cache
+
+
+def scenarios(end):
+    month = (end.replace(day=1) - timedelta(days=1)).replace(day=1)
+    month_end = end.replace(day=1) - timedelta(days=1)
+    year = end - timedelta(days=365)
+    return [
+        ('users_page', '/users?limit=100'),
+        ('users_projected', '/users?limit=100&fields=id,username'),
+        ('user', '/users/1'),
+        ('attendance_page', '/attendance?employee_id=1&limit=100'),
+        ('attendance_range', f'/attendance?employee_id=1&start_date={month}&end_date={month_end}'),
+        ('attendance_report_month', f'/attendance/report?start_date={month}&end_date={month_end}'),
+        ('attendance_report_year', f'/attendance/report?start_date={year}&end_date={end}'),
+        ('payroll_report_year', f'/payroll/report?start_date={year}&end_date={end}'),
+        ('payroll_report_monthly', f'/payroll/report?start_date={year}&end_date={end}&group_by=month'),
+        ('attendance_export_employee', f'/attendance/export?employee_id=1&start_date={year}'),
+    ]
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    index = min(len(samples) - 1, max(0, round(fraction * len(samples)) - 1))
+    return samples[index]
+
+
+# Run in a fresh interpreter: import + create_app, then one request.
+STARTUP_PROBE = '''
+import json, time
+started = time.perf_counter()
+from app import create_app
+app = create_app()
+ready = time.perf_counter()
+app.test_client().get(%r)
+print(json.dumps({'startup': ready - started, 'first_request': time.perf_counter() - ready}))
+'''
+
+
+def measure_startup(runs, path):
+    samples = {'startup': [], 'first_request': []}
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', STARTUP_PROBE % path],
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True,
+        ).stdout
+        for name, value in json.loads(output.strip().splitlines()[-1]).items():
+            samples[name].append(value)
+    return {
+        name: {
+            'p50_ms': percentile(values, 0.50) * 1000,
+            'p99_ms': percentile(values, 0.99) * 1000,
+            'rps': 1 / percentile(values, 0.50),
+            'errors': 0,
+        }
+        for name, values in samples.items()
+    }
+
+
+def make_requester(app, url, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    if url:
+        def request(path):
+            req = urllib.request.Request(url.rstrip('/') + path, headers=headers)
+            try:
+                with urllib.request.urlopen(req) as response:
+                    response.read()
+                    return response.status
+            except urllib.error.HTTPError as e:
+                return e.code
+        return request
+
+    local = threading.local()
+
+    def request(path):
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        return local.client.get(path, headers=headers).status_code
+    return request
+
+
+def run_scenario(request, path, requests, concurrency, cold_reports):
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    remaining = iter(range(requests))
+
+    def worker():
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            if cold_reports:
+                report_cache.invalidate('attendance')
+                report_cache.invalidate('payroll')
+            started = time.perf_counter()
+            status = request(path)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if status >= 400:
+                    errors.append(status)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    return {
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'rps': len(latencies) / wall,
+        'errors': len(errors),
+    }
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if not expected:
+            continue
+        for metric in ('p50_ms', 'p99_ms'):
+            if result[metric] > expected[metric] * (1 + tolerance):
+                regressions.append(f'{name} {metric}: {result[metric]:.2f} > {expected[metric]:.2f}')
+        if result['rps'] < expected['rps'] * (1 - tolerance):
+            regressions.append(f"{name} rps: {result['rps']:.1f} < {expected['rps']:.1f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='benchmark a running server instead of the test client')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--only', action='append', help='run only the named scenario(s)')
+    parser.add_argument('--end-date', type=date.fromisoformat, default=date.today())
+    parser.add_argument('--cold-reports', action='store_true',
+                        help='clear the report cache before each request (test client only)')
+    parser.add_argument('--baseline', help='fail if results regress against this JSON file')
+    parser.add_argument('--save-baseline', help='write results to this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative regression')
+    parser.add_argument('--startup', type=int, default=0, metavar='N', help='also measure N cold starts')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        token = create_access_token(identity={'email': 'benchmark@example.com', 'role_id': 1})
+    request = make_requester(app, args.url, token)
+    cold_reports = args.cold_reports and not args.url
+
+    results = {}
+    print(f"{'scenario':<28}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>10}{'errors':>8}")
+    if args.startup:
+        for name, result in measure_startup(args.startup, '/metrics').items():
+            results[name] = result
+            print(f"{name:<28}{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}{result['rps']:>10.1f}{result['errors']:>8}")
+    for name, path in scenarios(args.end_date):
+        if args.only and name not in args.only:
+            continue
+        for _ in range(args.warmup):
+            request(path)
+        result = run_scenario(request, path, args.requests, args.concurrency, cold_reports)
+        results[name] = result
+        print(f"{name:<28}{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}{result['rps']:>10.1f}{result['errors']:>8}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f'Baseline written to {args.save_baseline}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print('Regressions:')
+            for regression in regressions:
+                print(f'  {regression}')
+            sys.exit(1)
+        print('No regressions against baseline.')
+
+
+if __name__ == '__main__':
+    main()
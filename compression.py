@@ -0,0 +1,75 @@
+"""Response compression for clients that send Accept-Encoding.
+
+Buffered bodies at or over COMPRESS_MIN_SIZE are compressed whole. Streamed
+bodies such as exports and HTML views are compressed chunk by chunk and
+flushed after each one, so they still reach the client as they are produced.
+Brotli is offered only when the brotli package is installed; gzip always is.
+"""
+import zlib
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # optional; gzip covers every client
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/x-ndjson', 'text/csv', 'text/html', 'text/plain',
+}
+
+
+def compress(data, encoding, level, quality):
+    if encoding == 'br':
+        return brotli.compress(data, quality=quality)
+    return zlib.compress(data, level, wbits=31)
+
+
+def compress_stream(chunks, encoding, level, quality):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=quality)
+        process, flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        process, finish = compressor.compress, compressor.flush
+        flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            if chunk:
+                yield process(chunk) + flush()
+        yield finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+class Compression:
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
+        app.config.setdefault('COMPRESS_LEVEL', 6)
+        app.config.setdefault('COMPRESS_BR_QUALITY', 4)
+        app.after_request(self.compress_response)
+
+    def compress_response(self, response):
+        if (response.status_code < 200 or response.status_code in (204, 206, 304)
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES
+                or 'Content-Encoding' in response.headers):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(['br', 'gzip'] if brotli else ['gzip'])
+        if encoding is None:
+            return response
+        config = current_app.config
+        args = (encoding, config['COMPRESS_LEVEL'], config['COMPRESS_BR_QUALITY'])
+        if response.is_streamed:
+            response.response = compress_stream(response.response, *args)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < config['COMPRESS_MIN_SIZE']:
+                return response
+            response.set_data(compress(data, *args))
+        response.headers['Content-Encoding'] = encoding
+        return response
@@ -1,7 +1,6 @@
-from app import app, db
+from migration import migrate_to
 
-# Create an application context
-with app.app_context():
-    # Create the tables
-    db.create_all()
-    print("Tables created successfully.")
\ No newline at end of file
+# The schema comes from the Alembic migrations; this brings the database
+# (created if missing) up to the latest revision.
+migrate_to('head')
+print("Tables created successfully.")
@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+
+from sqlalchemy import event
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process serialization only
+    fcntl = None
+
+DEFAULT_SQLITE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'hrms.db')
+
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    # Negative cache_size is in KiB: 64 MiB page cache per connection.
+    'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -65536)),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    'temp_store': 'MEMORY',
+}
+
+
+def database_uri(default_sqlite_path=DEFAULT_SQLITE_PATH):
+    """DATABASE_URL wins (e.g. PostgreSQL); otherwise the local SQLite file."""
+    uri = os.environ.get('DATABASE_URL')
+    if not uri:
+        return f'sqlite:///{default_sqlite_path}'
+    if uri.startswith('postgres://'):
+        uri = 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+
+def engine_options(uri):
+    if uri.startswith('sqlite'):
+        # WAL lets readers run alongside the single writer, so the pool is
+        # sized for concurrent readers; the busy timeout covers writers from
+        # other processes.
+        return {
+            'pool_size': int(os.environ.get('SQLITE_POOL_SIZE', 8)),
+            'max_overflow': int(os.environ.get('SQLITE_MAX_OVERFLOW', 8)),
+            'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+            'connect_args': {
+                'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000,
+                'check_same_thread': False,
+            },
+        }
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': True,
+    }
+
+
+def configure_engine(engine):
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+
+class WriteQueueFull(Exception):
+    pass
+
+
+class WriteSerializer:
+    """Single-writer gate for SQLite.
+
+    Writers in this process queue on a lock, at most `max_waiting` deep; a
+    file lock next to the database extends the gate across worker processes.
+    Re-entrant per thread so nested write paths don't deadlock.
+    """
+
+    def __init__(self, lock_path=None, max_waiting=32, timeout=10.0):
+        self.lock_path = lock_path
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._state = threading.Lock()
+        self._waiting = 0
+        self._local = threading.local()
+        self._lock_file = None
+
+    def acquire(self):
+        depth = getattr(self._local, 'depth', 0)
+        if depth:
+            self._local.depth = depth + 1
+            return
+        with self._state:
+            if self._waiting >= self.max_waiting:
+                raise WriteQueueFull()
+            self._waiting += 1
+        try:
+            if not self._lock.acquire(timeout=self.timeout):
+                raise WriteQueueFull()
+        finally:
+            with self._state:
+                self._waiting -= 1
+        try:
+            self._acquire_file_lock()
+        except BaseException:
+            self._lock.release()
+            raise
+        self._local.depth = 1
+
+    def release(self):
+        self._local.depth -= 1
+        if self._local.depth:
+            return
+        if self._lock_file is not None:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+        self._lock.release()
+
+    def held(self):
+        return getattr(self._local, 'depth', 0) > 0
+
+    def _acquire_file_lock(self):
+        if fcntl is None or self.lock_path is None:
+            return
+        if self._lock_file is None:
+            self._lock_file = open(self.lock_path, 'a')
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    raise WriteQueueFull()
+                time.sleep(0.005)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
@@ -0,0 +1,271 @@
+"""Background jobs for long reports and exports.
+
+A job is submitted to a JobBackend, claimed by one of a JobRunner's worker
+threads and run by the app's `execute(app, job)`. Progress, cancellation and
+the result all go through the backend, so any worker process can answer
+for any job. TableBackend keeps the queue in the app database and stands in
+for a broker in local and no-network setups; another queue only needs the
+JobBackend methods.
+"""
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, select, update
+
+FINISHED = ('completed', 'failed', 'cancelled')
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobBackend:
+    """Where jobs wait, report progress and keep their results."""
+
+    def submit(self, job_type, params, owner):
+        raise NotImplementedError
+
+    def claim(self, limits, stale_before):
+        """Mark the oldest queued job whose type is below its limit in
+        `limits` as running and return it, or None. Running jobs with no
+        heartbeat since `stale_before` lost their worker and are failed."""
+        raise NotImplementedError
+
+    def heartbeat(self, job_ids):
+        raise NotImplementedError
+
+    def get(self, job_id):
+        raise NotImplementedError
+
+    def progress(self, job_id, done, total):
+        """Record progress; returns True once cancellation was requested."""
+        raise NotImplementedError
+
+    def finish(self, job_id, status, result=None, error=None):
+        raise NotImplementedError
+
+    def cancel(self, job_id):
+        """Cancel a queued job now, or ask a running one to stop."""
+        raise NotImplementedError
+
+    def prune(self, before):
+        """Delete jobs finished before `before`; returns their results."""
+        raise NotImplementedError
+
+
+class TableBackend(JobBackend):
+    """Jobs as rows of the `job` table.
+
+    Each call is its own short transaction under `write_lock`. With SQLite's
+    single writer that makes claims serial, so the per-type limits hold
+    across every worker process.
+    """
+
+    def __init__(self, table, engine, write_lock=nullcontext):
+        self.table = table
+        self.engine = engine
+        self.write_lock = write_lock
+
+    def _begin(self):
+        return self.engine().begin()
+
+    def submit(self, job_type, params, owner):
+        with self.write_lock(), self._begin() as connection:
+            return connection.execute(insert(self.table).values(
+                type=job_type, params=params, owner=owner, status='queued', done=0,
+                cancel_requested=False, created_at=datetime.utcnow(),
+            )).inserted_primary_key[0]
+
+    def claim(self, limits, stale_before):
+        job = self.table.c
+        now = datetime.utcnow()
+        with self.write_lock(), self._begin() as connection:
+            connection.execute(
+                update(self.table).where(job.status == 'running', job.updated_at < stale_before)
+                .values(status='failed', error='Worker stopped responding', finished_at=now, updated_at=now)
+            )
+            running = dict(connection.execute(
+                select(job.type, func.count()).where(job.status == 'running').group_by(job.type)
+            ).all())
+            open_types = [job_type for job_type, limit in limits.items() if running.get(job_type, 0) < limit]
+            if not open_types:
+                return None
+            row = connection.execute(
+                select(self.table).where(job.status == 'queued', job.type.in_(open_types)).order_by(job.id).limit(1)
+            ).first()
+            if row is None:
+                return None
+            claimed = connection.execute(
+                update(self.table).where(job.id == row.id, job.status == 'queued')
+                .values(status='running', started_at=now, updated_at=now)
+            ).rowcount
+            return row._asdict() if claimed else None
+
+    def heartbeat(self, job_ids):
+        if job_ids:
+            with self.write_lock(), self._begin() as connection:
+                connection.execute(
+                    update(self.table).where(self.table.c.id.in_(job_ids)).values(updated_at=datetime.utcnow())
+                )
+
+    def get(self, job_id):
+        with self.engine().connect() as connection:
+            row = connection.execute(select(self.table).where(self.table.c.id == job_id)).first()
+        return row._asdict() if row else None
+
+    def progress(self, job_id, done, total):
+        job = self.table.c
+        with self.write_lock(), self._begin() as connection:
+            connection.execute(
+                update(self.table).where(job.id == job_id)
+                .values(done=done, total=total, updated_at=datetime.utcnow())
+            )
+            return bool(connection.execute(select(job.cancel_requested).where(job.id == job_id)).scalar())
+
+    def finish(self, job_id, status, result=None, error=None):
+        now = datetime.utcnow()
+        with self.write_lock(), self._begin() as connection:
+            connection.execute(
+                update(self.table).where(self.table.c.id == job_id)
+                .values(status=status, result=result, error=error and error[:500], finished_at=now, updated_at=now)
+            )
+
+    def cancel(self, job_id):
+        job = self.table.c
+        now = datetime.utcnow()
+        with self.write_lock(), self._begin() as connection:
+            connection.execute(
+                update(self.table).where(job.id == job_id, job.status == 'queued')
+                .values(status='cancelled', finished_at=now, updated_at=now)
+            )
+            connection.execute(
+                update(self.table).where(job.id == job_id, job.status == 'running')
+                .values(cancel_requested=True, updated_at=now)
+            )
+
+    def prune(self, before):
+        job = self.table.c
+        finished = [job.status.in_(FINISHED), job.finished_at < before]
+        with self.write_lock(), self._begin() as connection:
+            results = connection.execute(select(job.result).where(*finished)).scalars().all()
+            connection.execute(delete(self.table).where(*finished))
+        return results
+
+
+class RunningJob:
+    """A claimed job as its handler sees it.
+
+    progress() writes through to the backend at most every `interval`
+    seconds and raises JobCancelled once a cancel has been requested, so
+    handlers stop at their next progress call.
+    """
+
+    def __init__(self, backend, row, interval):
+        self.backend = backend
+        self.id = row['id']
+        self.type = row['type']
+        self.params = row['params']
+        self.interval = interval
+        self.done = 0
+        self.total = None
+        self._reported = None
+
+    def progress(self, done=None, total=None, force=False):
+        if done is not None:
+            self.done = done
+        if total is not None:
+            self.total = total
+        now = time.monotonic()
+        if force or self._reported is None or now - self._reported >= self.interval:
+            self._reported = now
+            if self.backend.progress(self.id, self.done, self.total):
+                raise JobCancelled()
+
+    def advance(self, count):
+        self.progress(self.done + count)
+
+
+class JobRunner:
+    """Worker threads that claim jobs from `backend` and run `execute(app, job)`.
+
+    `limits` caps the running jobs of each type; types it leaves out are
+    never claimed. Threads are daemons and start on demand, once per process.
+    A heartbeat thread keeps this process's running jobs fresh, so jobs of a
+    worker that died are failed after `stale_after` seconds instead of
+    holding their type's slot forever.
+    """
+
+    def __init__(self, backend, execute):
+        self.backend = backend
+        self.execute = execute
+        self._threads = []
+        self._beat = None
+        self._running = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Condition()
+
+    def start(self, app, workers, limits, poll_interval=1.0, progress_interval=0.5, stale_after=300):
+        with self._lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            for _ in range(workers - len(self._threads)):
+                self._threads.append(
+                    self._spawn(self._work, app, dict(limits), poll_interval, progress_interval, stale_after)
+                )
+            if self._threads and self._beat is None:
+                self._beat = self._spawn(self._heartbeat, app, stale_after)
+            return list(self._threads)
+
+    def _spawn(self, target, *args):
+        thread = threading.Thread(target=target, args=args, name='job-worker', daemon=True)
+        thread.start()
+        return thread
+
+    def notify(self):
+        """Wake idle workers in this process, e.g. after a submit."""
+        with self._wake:
+            self._wake.notify_all()
+
+    def _heartbeat(self, app, stale_after):
+        while True:
+            time.sleep(stale_after / 3)
+            try:
+                with app.app_context():
+                    self.backend.heartbeat(list(self._running))
+            except Exception:
+                app.logger.exception("Job heartbeat failed")
+
+    def _work(self, app, limits, poll_interval, progress_interval, stale_after):
+        while True:
+            try:
+                with app.app_context():
+                    row = self.backend.claim(limits, datetime.utcnow() - timedelta(seconds=stale_after))
+            except Exception:
+                app.logger.exception("Claiming a job failed")
+                row = None
+            if row is None:
+                with self._wake:
+                    self._wake.wait(poll_interval)
+                continue
+            self._running.add(row['id'])
+            try:
+                self.run(app, RunningJob(self.backend, row, progress_interval))
+            except Exception:
+                app.logger.exception("Job %s could not be finished", row['id'])
+            finally:
+                self._running.discard(row['id'])
+
+    def run(self, app, job):
+        result = error = None
+        try:
+            result = self.execute(app, job)
+            status = 'completed'
+        except JobCancelled:
+            status = 'cancelled'
+        except Exception as e:
+            app.logger.exception("Job %s (%s) failed", job.id, job.type)
+            status, error = 'failed', str(e)
+        with app.app_context():
+            self.backend.finish(job.id, status, result, error)
+        self.notify()
@@ -0,0 +1,61 @@
+"""JSON encoding for HRMS responses.
+
+Uses orjson when it is installed and the stdlib json module otherwise. On
+either path dates and datetimes come out as ISO 8601 and Decimals as
+exact strings, as Flask's own provider writes them, so routes can hand over
+row tuples from column-only queries without formatting each value first.
+"""
+import json
+from datetime import date
+from decimal import Decimal
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib encoder gives the same output
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return DefaultJSONProvider.default(value)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    default = staticmethod(_default)
+    # Responses keep the key order the route built; sorting every object is
+    # pure overhead on large lists.
+    sort_keys = False
+
+    def encode(self, obj, pretty=False):
+        """`obj` as UTF-8 JSON bytes."""
+        if orjson is None:
+            spacing = {'indent': 2} if pretty else {'separators': (',', ':')}
+            return json.dumps(
+                obj, default=self.default, ensure_ascii=self.ensure_ascii, sort_keys=self.sort_keys, **spacing
+            ).encode()
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return self.encode(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = self.compact is False or (self.compact is None and self._app.debug)
+        return self._app.response_class(self.encode(obj, pretty) + b'\n', mimetype=self.mimetype)
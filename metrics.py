@@ -0,0 +1,135 @@
+import threading
+import time
+from collections import defaultdict
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+    def lines(self, name, labels):
+        for bound, count in zip(self.buckets, self.counts):
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {count}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.total}'
+        yield f'{name}_sum{{{labels}}} {self.sum}'
+        yield f'{name}_count{{{labels}}} {self.total}'
+
+
+class Metrics:
+    """Per-route request and SQL instrumentation, rendered as Prometheus text.
+
+    Counters live in this process only; each worker exposes its own and the
+    scraper aggregates them.
+    """
+
+    def __init__(self, app=None):
+        self.requests = defaultdict(int)
+        self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.statements = defaultdict(lambda: Histogram(STATEMENT_BUCKETS))
+        self.sql_seconds = defaultdict(float)
+        self.collectors = []
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SLOW_REQUEST_MS', None)
+        self.app = app
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.add_url_rule('/metrics', 'metrics', self.render)
+        if not event.contains(Engine, 'before_cursor_execute', self._before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+            event.listen(Engine, 'handle_error', self._handle_error)
+
+    def add_collector(self, collector):
+        """Register a callable returning extra exposition lines."""
+        self.collectors.append(collector)
+        return collector
+
+    def _start_request(self):
+        g.metrics_started = time.perf_counter()
+        g.sql_count = 0
+        g.sql_seconds = 0.0
+        g.sql_statements = [] if self.app.config['SLOW_REQUEST_MS'] is not None else None
+
+    def _finish_request(self, response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        with self._lock:
+            self.requests[(route, request.method, response.status_code)] += 1
+            self.latency[route].observe(elapsed)
+            self.statements[route].observe(g.sql_count)
+            self.sql_seconds[route] += g.sql_seconds
+        slow_ms = self.app.config['SLOW_REQUEST_MS']
+        if slow_ms is not None and elapsed * 1000 >= slow_ms:
+            queries = '\n'.join(
+                f'  {duration * 1000:.1f} ms  {statement}' for statement, duration in g.sql_statements
+            )
+            self.app.logger.warning(
+                'Slow request %s %s: %.1f ms, %d statements, %.1f ms in SQL\n%s',
+                request.method, request.full_path, elapsed * 1000,
+                g.sql_count, g.sql_seconds * 1000, queries,
+            )
+        return response
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['metrics_query_start'].pop()
+        if not has_request_context() or 'sql_count' not in g:
+            return
+        duration = time.perf_counter() - started
+        g.sql_count += 1
+        g.sql_seconds += duration
+        if g.sql_statements is not None:
+            g.sql_statements.append((' '.join(statement.split())[:500], duration))
+
+    def _handle_error(self, context):
+        # A failed statement never reaches after_cursor_execute; drop its
+        # start time so the next statement on the connection pops its own.
+        starts = context.connection.info.get('metrics_query_start') if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+    def render(self):
+        lines = ['# TYPE hrms_http_requests_total counter']
+        with self._lock:
+            for (route, method, status), count in sorted(self.requests.items()):
+                lines.append(
+                    f'hrms_http_requests_total{{route="{route}",method="{method}",status="{status}"}} {count}'
+                )
+            lines.append('# TYPE hrms_http_request_duration_seconds histogram')
+            for route, histogram in sorted(self.latency.items()):
+                lines.extend(histogram.lines('hrms_http_request_duration_seconds', f'route="{route}"'))
+            lines.append('# TYPE hrms_db_statements_per_request histogram')
+            for route, histogram in sorted(self.statements.items()):
+                lines.extend(histogram.lines('hrms_db_statements_per_request', f'route="{route}"'))
+            lines.append('# TYPE hrms_db_seconds_total counter')
+            for route, seconds in sorted(self.sql_seconds.items()):
+                lines.append(f'hrms_db_seconds_total{{route="{route}"}} {seconds}')
+        for collector in self.collectors:
+            lines.extend(collector())
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
@@ -1,69 +1,47 @@
-from flask_script import Manager
-from flask_migrate import Migrate, MigrateCommand
-from app import app, db
+"""Schema management without booting the HRMS app.
 
-migrate = Migrate(app, db)
-manager = Manager(app)
+    python migration.py                  # upgrade to head
+    python migration.py downgrade base
 
-manager.add_command('db', MigrateCommand)
+Builds a bare Flask app holding only the models and Flask-Migrate, so it runs
+the same migrations as `flask db ...` without the routes, caches and pools.
+"""
+import argparse
+import os
 
-# Define your models here
-class User(db.Model):
-    __tablename__ = 'user'
-    __table_args__ = {'extend_existing': True}
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False)
-    password = db.Column(db.String(120), nullable=False)
-    role_id = db.Column(db.Integer, nullable=False)
+from flask import Flask
+from flask_migrate import Migrate, downgrade, upgrade
 
-class Role(db.Model):
-    __tablename__ = 'role'
-    __table_args__ = {'extend_existing': True}
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(80), unique=True, nullable=False)
+from database import configure_engine, database_uri, engine_options
+from models import db
 
-class Employee(db.Model):
-    __tablename__ = 'employee'
-    __table_args__ = {'extend_existing': True}
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
-    email = db.Column(db.String(100), nullable=False, unique=True)
-    phone_number = db.Column(db.String(15), nullable=False)
-    address = db.Column(db.String(200), nullable=False)
-    city = db.Column(db.String(50), nullable=False)
-    state = db.Column(db.String(50), nullable=False)
-    zip_code = db.Column(db.String(20), nullable=False)
-    start_date = db.Column(db.Date, nullable=False)
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
 
-class Offboarding(db.Model):
-    __tablename__ = 'offboarding'
-    __table_args__ = {'extend_existing': True}
-    id = db.Column(db.Integer, primary_key=True)
-    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
-    offboarding_date = db.Column(db.Date, nullable=False)
-    reason = db.Column(db.String(200), nullable=False)
 
-class Attendance(db.Model):
-    __tablename__ = 'attendance'
-    __table_args__ = {'extend_existing': True}
-    id = db.Column(db.Integer, primary_key=True)
-    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
-    date = db.Column(db.Date, nullable=False)
-    status = db.Column(db.String(50), nullable=False)
-
-class Payroll(db.Model):
-    __tablename__ = 'payroll'
-    __table_args__ = {'extend_existing': True}
-    id = db.Column(db.Integer, primary_key=True)
-    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
-    payment_date = db.Column(db.Date, nullable=False)
+def create_migration_app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri()
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        configure_engine(db.engine)
+    Migrate(app, db, directory=MIGRATIONS_DIR)
+    return app
 
-with app.app_context():
-    db.create_all()
-    print("Database tables created/updated successfully!")
 
-if __name__ == "__main__":
+def migrate_to(revision='head', direction='upgrade'):
+    app = create_migration_app()
     with app.app_context():
-        db.create_all()
+        if direction == 'upgrade':
+            upgrade(directory=MIGRATIONS_DIR, revision=revision)
+        else:
+            downgrade(directory=MIGRATIONS_DIR, revision=revision)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('direction', nargs='?', choices=['upgrade', 'downgrade'], default='upgrade')
+    parser.add_argument('revision', nargs='?', default=None)
+    args = parser.parse_args()
+    migrate_to(args.revision or ('head' if args.direction == 'upgrade' else '-1'), args.direction)
@@ -0,0 +1,36 @@
+"""payroll run tracking
+
+Revision ID: 0c6e4b8d2a97
+Revises: f3a9d2c6b418
+Create Date: 2026-10-18 13:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0c6e4b8d2a97'
+down_revision = 'f3a9d2c6b418'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('payroll_run',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('pay_date', sa.Date(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('processed', sa.Integer(), nullable=False),
+    sa.Column('skipped', sa.Integer(), nullable=False),
+    sa.Column('amount_cents', sa.BigInteger(), nullable=False),
+    sa.Column('error', sa.String(length=500), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('payroll_run')
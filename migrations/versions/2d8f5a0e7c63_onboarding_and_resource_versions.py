@@ -0,0 +1,41 @@
+"""onboarding table and resource versions
+
+Revision ID: 2d8f5a0e7c63
+Revises: 0c6e4b8d2a97
+Create Date: 2026-10-18 14:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2d8f5a0e7c63'
+down_revision = '0c6e4b8d2a97'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('onboarding',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('employee_id', sa.Integer(), nullable=False),
+    sa.Column('start_date', sa.Date(), nullable=False),
+    sa.Column('end_date', sa.Date(), nullable=False),
+    sa.Column('documents_submitted', sa.Boolean(), nullable=False),
+    sa.Column('training_completed', sa.Boolean(), nullable=False),
+    sa.Column('status', sa.String(length=50), nullable=False),
+    sa.ForeignKeyConstraint(['employee_id'], ['employee.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('resource_version',
+    sa.Column('key', sa.String(length=100), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+
+
+def downgrade():
+    op.drop_table('resource_version')
+    op.drop_table('onboarding')
@@ -0,0 +1,53 @@
+"""workforce hire/exit timeline
+
+Revision ID: 3c8e5a1d7f46
+Revises: 9a4d6e2b7c15
+Create Date: 2026-10-18 18:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c8e5a1d7f46'
+down_revision = '9a4d6e2b7c15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('workforce_event',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('state', sa.String(length=50), nullable=False),
+    sa.Column('city', sa.String(length=50), nullable=False),
+    sa.Column('hires', sa.Integer(), nullable=False),
+    sa.Column('exits', sa.Integer(), nullable=False),
+    sa.Column('hire_ordinals', sa.BigInteger(), nullable=False),
+    sa.Column('exit_ordinals', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'state', 'city')
+    )
+    op.create_index('ix_workforce_event_state_city_day', 'workforce_event', ['state', 'city', 'day'], unique=False)
+    # Same as `flask rebuild-workforce-timeline`: a hire on start_date and an
+    # exit the day after each offboarding_date. Ordinals match date.toordinal().
+    if op.get_bind().dialect.name == 'sqlite':
+        ordinal = "CAST(julianday({}) - 1721424.5 AS INTEGER)"
+        next_day = "date({}, '+1 day')"
+    else:
+        ordinal = "({} - DATE '0001-01-01' + 1)"
+        next_day = "({} + 1)"
+    op.execute(
+        "INSERT INTO workforce_event (day, state, city, hires, exits, hire_ordinals, exit_ordinals) "
+        "SELECT day, state, city, SUM(hires), SUM(exits), SUM(hire_ordinals), SUM(exit_ordinals) FROM ("
+        f"SELECT start_date AS day, state, city, 1 AS hires, 0 AS exits, "
+        f"{ordinal.format('start_date')} AS hire_ordinals, 0 AS exit_ordinals FROM employee "
+        "UNION ALL "
+        f"SELECT {next_day.format('o.offboarding_date')}, e.state, e.city, 0, 1, 0, {ordinal.format('e.start_date')} "
+        "FROM offboarding o JOIN employee e ON e.id = o.employee_id"
+        ") events GROUP BY day, state, city"
+    )
+
+
+def downgrade():
+    op.drop_index('ix_workforce_event_state_city_day', table_name='workforce_event')
+    op.drop_table('workforce_event')
@@ -0,0 +1,52 @@
+"""full-text index for employee search
+
+Revision ID: 4e7a1c9d3b52
+Revises: 2d8f5a0e7c63
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4e7a1c9d3b52'
+down_revision = '2d8f5a0e7c63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # SQLite only; other backends fall back to prefix LIKE matching.
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("""CREATE VIRTUAL TABLE employee_fts USING fts5(
+        name, email, city, state, zip_code,
+        content='employee', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""")
+    op.execute("INSERT INTO employee_fts(employee_fts, rank) VALUES('rank', 'bm25(10.0, 5.0, 2.0, 1.0, 1.0)')")
+    op.execute("""CREATE TRIGGER employee_fts_insert AFTER INSERT ON employee BEGIN
+        INSERT INTO employee_fts(rowid, name, email, city, state, zip_code)
+        VALUES (new.id, new.name, new.email, new.city, new.state, new.zip_code);
+    END""")
+    op.execute("""CREATE TRIGGER employee_fts_delete AFTER DELETE ON employee BEGIN
+        INSERT INTO employee_fts(employee_fts, rowid, name, email, city, state, zip_code)
+        VALUES ('delete', old.id, old.name, old.email, old.city, old.state, old.zip_code);
+    END""")
+    op.execute("""CREATE TRIGGER employee_fts_update AFTER UPDATE ON employee BEGIN
+        INSERT INTO employee_fts(employee_fts, rowid, name, email, city, state, zip_code)
+        VALUES ('delete', old.id, old.name, old.email, old.city, old.state, old.zip_code);
+        INSERT INTO employee_fts(rowid, name, email, city, state, zip_code)
+        VALUES (new.id, new.name, new.email, new.city, new.state, new.zip_code);
+    END""")
+    op.execute("INSERT INTO employee_fts(employee_fts) VALUES('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("DROP TRIGGER employee_fts_update")
+    op.execute("DROP TRIGGER employee_fts_delete")
+    op.execute("DROP TRIGGER employee_fts_insert")
+    op.execute("DROP TABLE employee_fts")
@@ -0,0 +1,26 @@
+"""payroll index by employee
+
+Revision ID: 5d2f8b6a4c19
+Revises: 3c8e5a1d7f46
+Create Date: 2026-10-18 18:50:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2f8b6a4c19'
+down_revision = '3c8e5a1d7f46'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Serves the per-employee payroll view and last-payment lookups without
+    # scanning the whole table.
+    op.create_index('ix_payroll_employee_date', 'payroll', ['employee_id', 'payment_date'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_payroll_employee_date', table_name='payroll')
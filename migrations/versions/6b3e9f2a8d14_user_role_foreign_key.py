@@ -0,0 +1,26 @@
+"""user.role_id references role
+
+Revision ID: 6b3e9f2a8d14
+Revises: 4e7a1c9d3b52
+Create Date: 2026-10-18 15:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6b3e9f2a8d14'
+down_revision = '4e7a1c9d3b52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.create_foreign_key('fk_user_role_id_role', 'role', ['role_id'], ['id'])
+
+
+def downgrade():
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_constraint('fk_user_role_id_role', type_='foreignkey')
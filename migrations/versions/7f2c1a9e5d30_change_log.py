@@ -0,0 +1,35 @@
+"""change_log
+
+Revision ID: 7f2c1a9e5d30
+Revises: 6b3e9f2a8d14
+Create Date: 2026-10-18 16:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7f2c1a9e5d30'
+down_revision = '6b3e9f2a8d14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('change_log',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('entity', sa.String(length=20), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('op', sa.String(length=10), nullable=False),
+    sa.Column('data', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sqlite_autoincrement=True
+    )
+    op.create_index('ix_change_log_entity_id', 'change_log', ['entity', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_change_log_entity_id', table_name='change_log')
+    op.drop_table('change_log')
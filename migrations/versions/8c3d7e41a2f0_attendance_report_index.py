@@ -0,0 +1,26 @@
+"""covering index for attendance report
+
+Revision ID: 8c3d7e41a2f0
+Revises: 5a1f0c2e9b31
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c3d7e41a2f0'
+down_revision = '5a1f0c2e9b31'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # (date, employee_id, status) lets the report's range scan and
+    # GROUP BY be answered from the index alone.
+    op.create_index('ix_attendance_date_employee_status', 'attendance', ['date', 'employee_id', 'status'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_attendance_date_employee_status', table_name='attendance')
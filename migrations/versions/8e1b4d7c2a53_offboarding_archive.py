@@ -0,0 +1,59 @@
+"""archive tables for offboarded employees
+
+Revision ID: 8e1b4d7c2a53
+Revises: 5d2f8b6a4c19
+Create Date: 2026-10-18 19:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e1b4d7c2a53'
+down_revision = '5d2f8b6a4c19'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('offboarding', sa.Column('archived_at', sa.DateTime(), nullable=True))
+    op.create_table('attendance_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('employee_id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('status', sa.String(length=50), nullable=False),
+    sa.ForeignKeyConstraint(['employee_id'], ['employee.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_attendance_archive_date_employee_status', 'attendance_archive', ['date', 'employee_id', 'status'], unique=False)
+    op.create_index('ix_attendance_archive_employee_date', 'attendance_archive', ['employee_id', 'date'], unique=False)
+    op.create_table('attendance_month_archive',
+    sa.Column('employee_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('days', sa.LargeBinary(), nullable=False),
+    sa.ForeignKeyConstraint(['employee_id'], ['employee.id'], ),
+    sa.PrimaryKeyConstraint('employee_id', 'month')
+    )
+    op.create_table('payroll_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('employee_id', sa.Integer(), nullable=False),
+    sa.Column('amount_cents', sa.BigInteger(), nullable=False),
+    sa.Column('payment_date', sa.Date(), nullable=False),
+    sa.ForeignKeyConstraint(['employee_id'], ['employee.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_payroll_archive_payment_date_employee', 'payroll_archive', ['payment_date', 'employee_id', 'amount_cents'], unique=False)
+    op.create_index('ix_payroll_archive_employee_date', 'payroll_archive', ['employee_id', 'payment_date'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_payroll_archive_employee_date', table_name='payroll_archive')
+    op.drop_index('ix_payroll_archive_payment_date_employee', table_name='payroll_archive')
+    op.drop_table('payroll_archive')
+    op.drop_table('attendance_month_archive')
+    op.drop_index('ix_attendance_archive_employee_date', table_name='attendance_archive')
+    op.drop_index('ix_attendance_archive_date_employee_status', table_name='attendance_archive')
+    op.drop_table('attendance_archive')
+    with op.batch_alter_table('offboarding') as batch_op:
+        batch_op.drop_column('archived_at')
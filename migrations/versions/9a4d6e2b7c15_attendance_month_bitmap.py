@@ -0,0 +1,41 @@
+"""packed attendance months
+
+Revision ID: 9a4d6e2b7c15
+Revises: 7f2c1a9e5d30
+Create Date: 2026-10-18 17:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4d6e2b7c15'
+down_revision = '7f2c1a9e5d30'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    status = op.create_table('attendance_status',
+    sa.Column('code', sa.SmallInteger(), autoincrement=False, nullable=False),
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.PrimaryKeyConstraint('code'),
+    sa.UniqueConstraint('name')
+    )
+    op.bulk_insert(status, [
+        {'code': code, 'name': name}
+        for code, name in enumerate(['Present', 'Absent', 'Late', 'Half Day', 'Leave'], 1)
+    ])
+    op.create_table('attendance_month',
+    sa.Column('employee_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('days', sa.LargeBinary(), nullable=False),
+    sa.ForeignKeyConstraint(['employee_id'], ['employee.id'], ),
+    sa.PrimaryKeyConstraint('employee_id', 'month')
+    )
+
+
+def downgrade():
+    op.drop_table('attendance_month')
+    op.drop_table('attendance_status')
@@ -0,0 +1,51 @@
+"""registry of attendance/payroll period partitions
+
+Revision ID: a6c3f9e1b804
+Revises: 8e1b4d7c2a53
+Create Date: 2026-10-18 20:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6c3f9e1b804'
+down_revision = '8e1b4d7c2a53'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Only the registry; rows move into partitions with
+    # `flask partition-history`, which is safe to run on a live database.
+    op.create_table('data_partition',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('base', sa.String(length=50), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('period', sa.String(length=10), nullable=False),
+    sa.Column('period_start', sa.Date(), nullable=False),
+    sa.Column('period_end', sa.Date(), nullable=False),
+    sa.Column('rows', sa.Integer(), nullable=False),
+    sa.Column('path', sa.String(length=500), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_index('ix_data_partition_base_period', 'data_partition', ['base', 'period_start'], unique=False)
+
+
+def downgrade():
+    # Fold split partitions back into their live tables first; detached
+    # files have to be brought back by hand.
+    connection = op.get_bind()
+    partitions = connection.execute(sa.text('SELECT base, name, path FROM data_partition')).fetchall()
+    detached = [name for _, name, path in partitions if path]
+    if detached:
+        raise RuntimeError(f"Re-attach detached partitions before downgrading: {', '.join(detached)}")
+    for base, name, _ in partitions:
+        columns = ', '.join(column['name'] for column in sa.inspect(connection).get_columns(name))
+        op.execute(f'INSERT INTO {base} ({columns}) SELECT {columns} FROM {name}')
+        op.drop_table(name)
+    op.drop_index('ix_data_partition_base_period', table_name='data_partition')
+    op.drop_table('data_partition')
@@ -0,0 +1,40 @@
+"""monthly attendance rollup
+
+Revision ID: b47e2d9c0a15
+Revises: 8c3d7e41a2f0
+Create Date: 2026-10-18 10:15:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b47e2d9c0a15'
+down_revision = '8c3d7e41a2f0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('attendance_rollup',
+    sa.Column('employee_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('status', sa.String(length=50), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['employee_id'], ['employee.id'], ),
+    sa.PrimaryKeyConstraint('employee_id', 'month', 'status')
+    )
+    if op.get_bind().dialect.name == 'sqlite':
+        month = "date(date, 'start of month')"
+    else:
+        month = "date_trunc('month', date)"
+    op.execute(
+        "INSERT INTO attendance_rollup (employee_id, month, status, count) "
+        f"SELECT employee_id, {month}, status, COUNT(*) FROM attendance "
+        f"GROUP BY employee_id, {month}, status"
+    )
+
+
+def downgrade():
+    op.drop_table('attendance_rollup')
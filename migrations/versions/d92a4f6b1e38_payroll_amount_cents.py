@@ -0,0 +1,36 @@
+"""store payroll amounts in integer cents
+
+Revision ID: d92a4f6b1e38
+Revises: b47e2d9c0a15
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd92a4f6b1e38'
+down_revision = 'b47e2d9c0a15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('payroll') as batch_op:
+        batch_op.add_column(sa.Column('amount_cents', sa.BigInteger(), nullable=True))
+    op.execute("UPDATE payroll SET amount_cents = CAST(ROUND(amount * 100) AS BIGINT)")
+    with op.batch_alter_table('payroll') as batch_op:
+        batch_op.alter_column('amount_cents', existing_type=sa.BigInteger(), nullable=False)
+        batch_op.drop_column('amount')
+    op.create_index('ix_payroll_payment_date_employee', 'payroll', ['payment_date', 'employee_id', 'amount_cents'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_payroll_payment_date_employee', table_name='payroll')
+    with op.batch_alter_table('payroll') as batch_op:
+        batch_op.add_column(sa.Column('amount', sa.Float(), nullable=True))
+    op.execute("UPDATE payroll SET amount = amount_cents / 100.0")
+    with op.batch_alter_table('payroll') as batch_op:
+        batch_op.alter_column('amount', existing_type=sa.Float(), nullable=False)
+        batch_op.drop_column('amount_cents')
@@ -0,0 +1,24 @@
+"""index attendance by employee and date
+
+Revision ID: e1b5c8a3f702
+Revises: d92a4f6b1e38
+Create Date: 2026-10-18 11:45:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1b5c8a3f702'
+down_revision = 'd92a4f6b1e38'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_attendance_employee_date', 'attendance', ['employee_id', 'date'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_attendance_employee_date', table_name='attendance')
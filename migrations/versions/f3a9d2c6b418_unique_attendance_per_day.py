@@ -0,0 +1,42 @@
+"""one attendance row per employee per day
+
+Revision ID: f3a9d2c6b418
+Revises: e1b5c8a3f702
+Create Date: 2026-10-18 12:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a9d2c6b418'
+down_revision = 'e1b5c8a3f702'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keep the most recent row for any duplicated (employee_id, date) and
+    # recompute the rollups it fed.
+    op.execute(
+        "DELETE FROM attendance WHERE id NOT IN "
+        "(SELECT MAX(id) FROM attendance GROUP BY employee_id, date)"
+    )
+    if op.get_bind().dialect.name == 'sqlite':
+        month = "date(date, 'start of month')"
+    else:
+        month = "date_trunc('month', date)"
+    op.execute("DELETE FROM attendance_rollup")
+    op.execute(
+        "INSERT INTO attendance_rollup (employee_id, month, status, count) "
+        f"SELECT employee_id, {month}, status, COUNT(*) FROM attendance "
+        f"GROUP BY employee_id, {month}, status"
+    )
+    op.drop_index('ix_attendance_employee_date', table_name='attendance')
+    op.create_index('uq_attendance_employee_date', 'attendance', ['employee_id', 'date'], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_attendance_employee_date', table_name='attendance')
+    op.create_index('ix_attendance_employee_date', 'attendance', ['employee_id', 'date'], unique=False)
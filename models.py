@@ -0,0 +1,326 @@
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import DDL, event
+
+db = SQLAlchemy()
+
+class User(db.Model):
+    __tablename__ = 'user'
+    __table_args__ = {'extend_existing': True}
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), unique=True, nullable=False)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    password = db.Column(db.String(120), nullable=False)
+    role_id = db.Column(db.Integer, db.ForeignKey('role.id'), nullable=False)
+    role = db.relationship('Role')
+
+    def __repr__(self):
+        return f'<User {self.username}>'
+
+class Role(db.Model):
+    __tablename__ = 'role'
+    __table_args__ = {'extend_existing': True}
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(80), unique=True, nullable=False)
+
+    def __repr__(self):
+        return f'<Role {self.name}>'
+
+def to_cents(amount):
+    return int((Decimal(str(amount)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+class Payroll(db.Model):
+    __tablename__ = 'payroll'
+    __table_args__ = (
+        db.Index('ix_payroll_payment_date_employee', 'payment_date', 'employee_id', 'amount_cents'),
+        db.Index('ix_payroll_employee_date', 'employee_id', 'payment_date'),
+        {'extend_existing': True},
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
+    # Stored in integer minor units so sums are exact.
+    amount_cents = db.Column(db.BigInteger, nullable=False)
+    payment_date = db.Column(db.Date, nullable=False)
+
+    @property
+    def amount(self):
+        return Decimal(self.amount_cents) / 100
+
+    @amount.setter
+    def amount(self, value):
+        self.amount_cents = to_cents(value)
+
+    def __repr__(self):
+        return f'<Payroll {self.employee_id} - {self.amount}>'
+
+class Attendance(db.Model):
+    __tablename__ = 'attendance'
+    __table_args__ = (
+        db.Index('ix_attendance_date_employee_status', 'date', 'employee_id', 'status'),
+        db.Index('uq_attendance_employee_date', 'employee_id', 'date', unique=True),
+        {'extend_existing': True},
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    status = db.Column(db.String(50), nullable=False)
+
+    def __repr__(self):
+        return f'<Attendance {self.employee_id} - {self.date} - {self.status}>'
+
+class AttendanceRollup(db.Model):
+    __tablename__ = 'attendance_rollup'
+    __table_args__ = {'extend_existing': True}
+    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), primary_key=True)
+    month = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.String(50), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<AttendanceRollup {self.employee_id} - {self.month} - {self.status}>'
+
+class AttendanceStatus(db.Model):
+    __tablename__ = 'attendance_status'
+    __table_args__ = {'extend_existing': True}
+    code = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(50), unique=True, nullable=False)
+
+    def __repr__(self):
+        return f'<AttendanceStatus {self.code} - {self.name}>'
+
+class AttendanceMonth(db.Model):
+    __tablename__ = 'attendance_month'
+    __table_args__ = {'extend_existing': True}
+    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), primary_key=True)
+    month = db.Column(db.Date, primary_key=True)
+    # One status code per day of the month, 0 where nothing was recorded.
+    days = db.Column(db.LargeBinary, nullable=False)
+
+    def __repr__(self):
+        return f'<AttendanceMonth {self.employee_id} - {self.month}>'
+
+class Employee(db.Model):
+    __tablename__ = 'employee'
+    __table_args__ = {'extend_existing': True}
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    email = db.Column(db.String(100), nullable=False, unique=True)
+    phone_number = db.Column(db.String(15), nullable=False)
+    address = db.Column(db.String(200), nullable=False)
+    city = db.Column(db.String(50), nullable=False)
+    state = db.Column(db.String(50), nullable=False)
+    zip_code = db.Column(db.String(20), nullable=False)
+    start_date = db.Column(db.Date, nullable=False)
+
+    def __repr__(self):
+        return f'<Employee {self.name}>'
+
+# External-content FTS5 index over the directory fields, kept in sync by
+# triggers so every write path (ORM, bulk inserts, raw SQL) is covered.
+# prefix='2 3' pre-indexes short prefixes for typeahead.
+EMPLOYEE_FTS_DDL = [
+    """CREATE VIRTUAL TABLE employee_fts USING fts5(
+        name, email, city, state, zip_code,
+        content='employee', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """INSERT INTO employee_fts(employee_fts, rank) VALUES('rank', 'bm25(10.0, 5.0, 2.0, 1.0, 1.0)')""",
+    """CREATE TRIGGER employee_fts_insert AFTER INSERT ON employee BEGIN
+        INSERT INTO employee_fts(rowid, name, email, city, state, zip_code)
+        VALUES (new.id, new.name, new.email, new.city, new.state, new.zip_code);
+    END""",
+    """CREATE TRIGGER employee_fts_delete AFTER DELETE ON employee BEGIN
+        INSERT INTO employee_fts(employee_fts, rowid, name, email, city, state, zip_code)
+        VALUES ('delete', old.id, old.name, old.email, old.city, old.state, old.zip_code);
+    END""",
+    """CREATE TRIGGER employee_fts_update AFTER UPDATE ON employee BEGIN
+        INSERT INTO employee_fts(employee_fts, rowid, name, email, city, state, zip_code)
+        VALUES ('delete', old.id, old.name, old.email, old.city, old.state, old.zip_code);
+        INSERT INTO employee_fts(rowid, name, email, city, state, zip_code)
+        VALUES (new.id, new.name, new.email, new.city, new.state, new.zip_code);
+    END""",
+]
+for statement in EMPLOYEE_FTS_DDL:
+    event.listen(Employee.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+class Offboarding(db.Model):
+    __tablename__ = 'offboarding'
+    __table_args__ = {'extend_existing': True}
+    id = db.Column(db.Integer, primary_key=True)
+    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
+    offboarding_date = db.Column(db.Date, nullable=False)
+    reason = db.Column(db.String(200), nullable=False)
+    # Set once the employee's attendance and payroll have been moved to the
+    # archive tables.
+    archived_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<Offboarding {self.employee_id}>'
+
+class Onboarding(db.Model):
+    __tablename__ = 'onboarding'
+    __table_args__ = {'extend_existing': True}
+    id = db.Column(db.Integer, primary_key=True)
+    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)
+    documents_submitted = db.Column(db.Boolean, nullable=False, default=False)
+    training_completed = db.Column(db.Boolean, nullable=False, default=False)
+    status = db.Column(db.String(50), nullable=False)
+
+    def __repr__(self):
+        return f'<Onboarding {self.employee_id}>'
+
+class ResourceVersion(db.Model):
+    __tablename__ = 'resource_version'
+    __table_args__ = {'extend_existing': True}
+    key = db.Column(db.String(100), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ResourceVersion {self.key} - {self.version}>'
+
+class PayrollRun(db.Model):
+    __tablename__ = 'payroll_run'
+    __table_args__ = {'extend_existing': True}
+    id = db.Column(db.Integer, primary_key=True)
+    pay_date = db.Column(db.Date, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    total = db.Column(db.Integer, nullable=False, default=0)
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    skipped = db.Column(db.Integer, nullable=False, default=0)
+    amount_cents = db.Column(db.BigInteger, nullable=False, default=0)
+    error = db.Column(db.String(500))
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<PayrollRun {self.id} - {self.pay_date} - {self.status}>'
+
+class ChangeLog(db.Model):
+    __tablename__ = 'change_log'
+    __table_args__ = (
+        db.Index('ix_change_log_entity_id', 'entity', 'id'),
+        # Ids are cursors: never hand out one that was used and pruned.
+        {'extend_existing': True, 'sqlite_autoincrement': True},
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(20), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(10), nullable=False)
+    data = db.Column(db.JSON)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ChangeLog {self.id} - {self.entity} {self.entity_id} {self.op}>'
+
+class WorkforceEvent(db.Model):
+    __tablename__ = 'workforce_event'
+    __table_args__ = (
+        db.Index('ix_workforce_event_state_city_day', 'state', 'city', 'day'),
+        {'extend_existing': True},
+    )
+    # Net hires and exits per day and location. The *_ordinals columns sum
+    # start_date.toordinal() of the people counted, which is all average
+    # tenure needs.
+    day = db.Column(db.Date, primary_key=True)
+    state = db.Column(db.String(50), primary_key=True)
+    city = db.Column(db.String(50), primary_key=True)
+    hires = db.Column(db.Integer, nullable=False, default=0)
+    exits = db.Column(db.Integer, nullable=False, default=0)
+    hire_ordinals = db.Column(db.BigInteger, nullable=False, default=0)
+    exit_ordinals = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<WorkforceEvent {self.day} - {self.state} {self.city}>'
+
+# Archived history of offboarded employees: same columns (and ids) as the
+# live tables, kept out of them so their indexes stay small.
+class AttendanceArchive(db.Model):
+    __tablename__ = 'attendance_archive'
+    __table_args__ = (
+        db.Index('ix_attendance_archive_date_employee_status', 'date', 'employee_id', 'status'),
+        db.Index('ix_attendance_archive_employee_date', 'employee_id', 'date'),
+        {'extend_existing': True},
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    status = db.Column(db.String(50), nullable=False)
+
+    def __repr__(self):
+        return f'<AttendanceArchive {self.employee_id} - {self.date} - {self.status}>'
+
+class AttendanceMonthArchive(db.Model):
+    __tablename__ = 'attendance_month_archive'
+    __table_args__ = {'extend_existing': True}
+    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), primary_key=True)
+    month = db.Column(db.Date, primary_key=True)
+    days = db.Column(db.LargeBinary, nullable=False)
+
+    def __repr__(self):
+        return f'<AttendanceMonthArchive {self.employee_id} - {self.month}>'
+
+class PayrollArchive(db.Model):
+    __tablename__ = 'payroll_archive'
+    __table_args__ = (
+        db.Index('ix_payroll_archive_payment_date_employee', 'payment_date', 'employee_id', 'amount_cents'),
+        db.Index('ix_payroll_archive_employee_date', 'employee_id', 'payment_date'),
+        {'extend_existing': True},
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
+    amount_cents = db.Column(db.BigInteger, nullable=False)
+    payment_date = db.Column(db.Date, nullable=False)
+
+    def __repr__(self):
+        return f'<PayrollArchive {self.employee_id} - {self.payment_date}>'
+
+class DataPartition(db.Model):
+    __tablename__ = 'data_partition'
+    __table_args__ = (
+        db.Index('ix_data_partition_base_period', 'base', 'period_start'),
+        {'extend_existing': True},
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    base = db.Column(db.String(50), nullable=False)
+    name = db.Column(db.String(100), nullable=False, unique=True)
+    period = db.Column(db.String(10), nullable=False)
+    period_start = db.Column(db.Date, nullable=False)
+    # Exclusive; the partition holds base rows dated in [period_start, period_end).
+    period_end = db.Column(db.Date, nullable=False)
+    rows = db.Column(db.Integer, nullable=False, default=0)
+    # Set once the partition has been detached to a read-only SQLite file.
+    path = db.Column(db.String(500))
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<DataPartition {self.name}>'
+
+class Job(db.Model):
+    __tablename__ = 'job'
+    __table_args__ = (
+        db.Index('ix_job_status_type', 'status', 'type', 'id'),
+        {'extend_existing': True},
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    type = db.Column(db.String(40), nullable=False)
+    # Query arguments, as the synchronous route would have received them.
+    params = db.Column(db.JSON, nullable=False)
+    owner = db.Column(db.String(120))
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    done = db.Column(db.BigInteger, nullable=False, default=0)
+    total = db.Column(db.BigInteger)
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    result = db.Column(db.JSON)
+    error = db.Column(db.String(500))
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<Job {self.id} - {self.type} - {self.status}>'
@@ -0,0 +1,76 @@
+"""Period partitions for attendance and payroll history.
+
+Closed periods can be split out of a live table into one table per year or
+month (attendance_p2024, payroll_p2024_03) and later detached into a
+read-only SQLite file. The live table keeps every open period, so readers
+visit the overlapping partitions in period order and then the live table.
+"""
+import threading
+from datetime import date
+
+from sqlalchemy import Column, Index, MetaData, Table, create_engine
+
+PERIODS = ('year', 'month')
+
+
+class PeriodClosed(Exception):
+    def __init__(self, partition):
+        super().__init__(partition)
+        self.partition = partition
+
+
+def period_start(day, period):
+    return date(day.year, 1, 1) if period == 'year' else date(day.year, day.month, 1)
+
+
+def next_period(start, period):
+    if period == 'year':
+        return date(start.year + 1, 1, 1)
+    return date(start.year + (start.month == 12), start.month % 12 + 1, 1)
+
+
+def partition_name(base, start, period):
+    if period == 'year':
+        return f'{base}_p{start.year}'
+    return f'{base}_p{start.year}_{start.month:02d}'
+
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def partition_table(table, name):
+    """A copy of `table` named `name`, indexes renamed to match. No foreign
+    keys: partitions only ever receive rows that already passed them."""
+    with _tables_lock:
+        if name not in _tables:
+            copy = Table(name, MetaData(), *(
+                Column(column.name, column.type, primary_key=column.primary_key,
+                       nullable=column.nullable, autoincrement=False)
+                for column in table.columns
+            ))
+            for index in table.indexes:
+                Index(index.name.replace(table.name, name, 1),
+                      *(copy.c[column.name] for column in index.columns), unique=index.unique)
+            _tables[name] = copy
+        return _tables[name]
+
+
+class ReadOnlyEngines:
+    """One engine per detached partition file, opened with mode=ro."""
+
+    def __init__(self):
+        self._engines = {}
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        with self._lock:
+            if path not in self._engines:
+                self._engines[path] = create_engine(f'sqlite:///file:{path}?mode=ro&uri=true')
+            return self._engines[path]
+
+    def dispose(self, path):
+        with self._lock:
+            engine = self._engines.pop(path, None)
+        if engine is not None:
+            engine.dispose()
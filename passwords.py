@@ -0,0 +1,134 @@
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent import futures
+from concurrent.futures import ThreadPoolExecutor
+
+SCRYPT_N = int(os.environ.get('PASSWORD_SCRYPT_N', 2 ** 14))
+SCRYPT_R = int(os.environ.get('PASSWORD_SCRYPT_R', 8))
+SCRYPT_P = int(os.environ.get('PASSWORD_SCRYPT_P', 1))
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+
+class HashQueueFull(Exception):
+    pass
+
+
+def _b64(raw):
+    return base64.b64encode(raw).decode('ascii')
+
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=n, r=r, p=p,
+        maxmem=128 * r * (n + p + 2), dklen=HASH_BYTES,
+    )
+
+
+def hash_password(password, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P):
+    """scrypt$n$r$p$salt$hash, short enough for user.password (120 chars)."""
+    salt = os.urandom(SALT_BYTES)
+    return f'scrypt${n}${r}${p}${_b64(salt)}${_b64(_scrypt(password, salt, n, r, p))}'
+
+
+def verify_password(password, stored):
+    """Return (matches, needs_rehash).
+
+    Rows written before hashing hold the plaintext; they still verify and are
+    flagged for rehash, as are hashes made with weaker scrypt parameters.
+    """
+    if not stored.startswith('scrypt$'):
+        return hmac.compare_digest(password.encode(), stored.encode()), True
+    try:
+        _, n, r, p, salt, expected = stored.split('$')
+        n, r, p = int(n), int(r), int(p)
+        actual = _scrypt(password, base64.b64decode(salt), n, r, p)
+    except ValueError:
+        return False, False
+    matches = hmac.compare_digest(actual, base64.b64decode(expected))
+    return matches, matches and (n, r, p) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+
+
+class PasswordHasher:
+    """Runs hashing on its own small pool so login bursts can't take every
+    request thread. hashlib.scrypt releases the GIL, so the pool uses real
+    cores. Callers beyond `max_queue` in flight get HashQueueFull, as do
+    callers whose hash hasn't finished within `timeout`.
+    """
+
+    def __init__(self, max_workers=2, max_queue=32, timeout=10.0):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(max_queue)
+        self._dummy = None
+
+    def hash(self, password):
+        return self._submit(hash_password, password)
+
+    def verify(self, password, stored):
+        """Verify against `stored`, or a dummy hash when there is no account,
+        so unknown emails cost the same as wrong passwords.
+        """
+        if stored is None:
+            if self._dummy is None:
+                # Built on first use rather than at import, to keep startup fast.
+                self._dummy = self._submit(hash_password, _b64(os.urandom(SALT_BYTES)))
+            self._submit(verify_password, password, self._dummy)
+            return False, False
+        return self._submit(verify_password, password, stored)
+
+    def _submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashQueueFull()
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot is held until the work is done, not just until the caller
+        # gives up on it, so timed-out hashes still count against max_queue.
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except futures.TimeoutError:
+            future.cancel()
+            raise HashQueueFull()
+
+
+class RateLimiter:
+    """Sliding-window attempt counter, per process."""
+
+    def __init__(self, limit, window, max_keys=100000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._attempts = defaultdict(deque)
+        self._lock = threading.Lock()
+
+    def hit(self, key):
+        """Record an attempt; return seconds to wait if over the limit, else 0."""
+        now = time.monotonic()
+        with self._lock:
+            if len(self._attempts) >= self.max_keys:
+                self._sweep(now)
+            attempts = self._attempts[key]
+            while attempts and attempts[0] <= now - self.window:
+                attempts.popleft()
+            if len(attempts) >= self.limit:
+                return int(attempts[0] + self.window - now) + 1
+            attempts.append(now)
+            return 0
+
+    def reset(self, key):
+        with self._lock:
+            self._attempts.pop(key, None)
+
+    def _sweep(self, now):
+        for key in [key for key, attempts in self._attempts.items()
+                    if not attempts or attempts[-1] <= now - self.window]:
+            del self._attempts[key]
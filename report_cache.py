@@ -0,0 +1,145 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+
+class CacheBackend:
+    """Key/value store behind ReportCache. Values must be JSON-serializable."""
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        raise NotImplementedError
+
+    def delete(self, keys):
+        raise NotImplementedError
+
+    def keys(self, prefix):
+        raise NotImplementedError
+
+
+class MemoryBackend(CacheBackend):
+    """Per-process LRU with a TTL; the default and the stand-in for tests."""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def keys(self, prefix):
+        with self._lock:
+            return [key for key in self._entries if key.startswith(prefix)]
+
+
+class RedisBackend(CacheBackend):
+    """Shared cache for multi-worker deployments; needs the redis package."""
+
+    def __init__(self, url, namespace='hrms:'):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.namespace = namespace
+
+    def get(self, key):
+        value = self.client.get(self.namespace + key)
+        return None if value is None else json.loads(value)
+
+    def set(self, key, value, ttl):
+        self.client.setex(self.namespace + key, int(ttl), json.dumps(value))
+
+    def delete(self, keys):
+        keys = [self.namespace + key for key in keys]
+        if keys:
+            self.client.delete(*keys)
+
+    def keys(self, prefix):
+        skip = len(self.namespace)
+        return [
+            key.decode()[skip:]
+            for key in self.client.scan_iter(match=self.namespace + prefix + '*')
+        ]
+
+
+class ReportCache:
+    """Read-through cache for date-range reports.
+
+    Keys embed the report name and its [start, end] range, so a write on a
+    given day only evicts the entries whose range contains that day.
+    """
+
+    def __init__(self, backend, ttl=300):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(report, start_date, end_date, params=None):
+        params = json.dumps(params or {}, sort_keys=True, separators=(',', ':'))
+        return f'report:{report}:{start_date.isoformat()}:{end_date.isoformat()}:{params}'
+
+    def get_or_compute(self, report, start_date, end_date, params, compute, cached=True):
+        """The cached report, else compute(). cached=False skips the cache
+        both ways, for reads that may see uncommitted rows."""
+        if not cached:
+            return compute()
+        key = self.key(report, start_date, end_date, params)
+        value = self.backend.get(key)
+        if value is not None:
+            self._count('hits')
+            return value
+        self._count('misses')
+        value = compute()
+        self.backend.set(key, value, self.ttl)
+        return value
+
+    def invalidate(self, report, days=None):
+        """Drop cached `report` entries covering any of `days` (all if None)."""
+        prefix = f'report:{report}:'
+        if days is not None:
+            days = {day.date() if hasattr(day, 'date') else day for day in days}
+        stale = []
+        for key in self.backend.keys(prefix):
+            start, end = key[len(prefix):].split(':', 2)[:2]
+            start, end = date.fromisoformat(start), date.fromisoformat(end)
+            if days is None or any(start <= day <= end for day in days):
+                stale.append(key)
+        if stale:
+            self.backend.delete(stale)
+            self._count('invalidations', len(stale))
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'invalidations': self.invalidations}
+
+    def _count(self, counter, amount=1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
@@ -1,13 +1,14 @@
 import os
-from app import db, app
 
-# Ensure the database path is persistent
-db_path = os.path.join(os.path.dirname(__file__), 'instance', 'hrms.db')
-if os.path.exists(db_path):
-    os.remove(db_path)
+from database import DEFAULT_SQLITE_PATH
+from migration import migrate_to
 
-with app.app_context():
-    db.drop_all()
-    db.create_all()
+if not os.environ.get('DATABASE_URL'):
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(DEFAULT_SQLITE_PATH + suffix):
+            os.remove(DEFAULT_SQLITE_PATH + suffix)
+else:
+    migrate_to('base', 'downgrade')
+migrate_to('head')
 
 print("Database tables dropped and recreated successfully!")
@@ -0,0 +1,175 @@
+"""Fill the database with a synthetic HR dataset for load testing.
+
+    python seed_db.py --employees 100000 --days 500
+
+generates 100k employees and ~31M attendance rows: one per weekday (~357 in
+500 days, so at most 35.7M), from each employee's start date, which can fall
+inside the window, to their exit date if they left. Run it against an empty,
+migrated database. Rows are produced lazily and written with executemany in
+chunks, one transaction per chunk.
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from app import (
+    attendance_is_bitmap, attendance_statuses, create_app, rebuild_attendance_rollups, rebuild_workforce_timeline,
+)
+from models import db, Attendance, AttendanceMonth, Employee, Offboarding, Payroll, Role, User
+from attendance_bitmap import empty_month
+from passwords import hash_password
+
+FIRST_NAMES = ['James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David',
+               'Elizabeth', 'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah',
+               'Priya', 'Wei', 'Carlos', 'Fatima', 'Olga', 'Kenji', 'Amara', 'Luca', 'Aisha', 'Mateo']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez',
+              'Martinez', 'Hernandez', 'Lopez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Patel',
+              'Nguyen', 'Kim', 'Chen', 'Singh', 'Okafor', 'Rossi', 'Novak', 'Tanaka', 'Haddad', 'Silva']
+LOCATIONS = [('New York', 'NY', '10001'), ('Los Angeles', 'CA', '90001'), ('Chicago', 'IL', '60601'),
+             ('Houston', 'TX', '77001'), ('Phoenix', 'AZ', '85001'), ('Philadelphia', 'PA', '19101'),
+             ('San Antonio', 'TX', '78201'), ('San Diego', 'CA', '92101'), ('Dallas', 'TX', '75201'),
+             ('Austin', 'TX', '73301'), ('Seattle', 'WA', '98101'), ('Denver', 'CO', '80201'),
+             ('Boston', 'MA', '02101'), ('Atlanta', 'GA', '30301'), ('Miami', 'FL', '33101')]
+ROLES = ['Admin', 'HR', 'Manager', 'Employee']
+STATUSES = ['Present', 'Absent', 'Late', 'Half Day', 'Leave']
+STATUS_WEIGHTS = [88, 4, 4, 2, 2]
+REASONS = ['Resignation', 'Retirement', 'Termination', 'Relocation', 'Contract ended']
+
+
+def chunked_insert(model, rows, chunk_size):
+    total = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            db.session.execute(model.__table__.insert(), chunk)
+            db.session.commit()
+            total += len(chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(model.__table__.insert(), chunk)
+        db.session.commit()
+        total += len(chunk)
+    return total
+
+
+def generate(args):
+    rng = random.Random(args.seed)
+    end = args.end_date
+    first_day = end - timedelta(days=args.days - 1)
+    employees = []
+    for employee_id in range(1, args.employees + 1):
+        city, state, zip_code = rng.choice(LOCATIONS)
+        start = end - timedelta(days=rng.randrange(args.days + 3650))
+        left = None
+        if rng.random() < args.offboarded:
+            left = start + timedelta(days=rng.randrange(30, max(31, (end - start).days + 1)))
+            left = min(left, end)
+        employees.append((employee_id, city, state, zip_code, start, left))
+
+    def employee_rows():
+        for employee_id, city, state, zip_code, start, _ in employees:
+            yield {
+                'id': employee_id,
+                'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                'email': f'employee{employee_id}@example.com',
+                'phone_number': f'555{employee_id:07d}'[-10:],
+                'address': f'{rng.randrange(1, 9999)} Main St',
+                'city': city,
+                'state': state,
+                'zip_code': zip_code,
+                'start_date': start,
+            }
+
+    def user_rows():
+        # One hash shared by every seeded user; scrypt per row would dominate the run.
+        password = hash_password('password')
+        for user_id in range(1, args.users + 1):
+            yield {
+                'id': user_id,
+                'username': f'user{user_id}',
+                'email': f'user{user_id}@example.com',
+                'password': password,
+                'role_id': 1 if user_id == 1 else rng.randrange(2, len(ROLES) + 1),
+            }
+
+    def attendance_rows():
+        for employee_id, _, _, _, start, left in employees:
+            day = max(start, first_day)
+            last = left or end
+            while day <= last:
+                if day.weekday() < 5:
+                    yield {
+                        'employee_id': employee_id,
+                        'date': day,
+                        'status': rng.choices(STATUSES, STATUS_WEIGHTS)[0],
+                    }
+                day += timedelta(days=1)
+
+    def attendance_month_rows():
+        # Same days and statuses as attendance_rows, packed per employee-month.
+        codes = {status: attendance_statuses.code(status) for status in STATUSES}
+        current = None
+        for row in attendance_rows():
+            month = row['date'].replace(day=1)
+            if current is None or (current['employee_id'], current['month']) != (row['employee_id'], month):
+                if current is not None:
+                    yield {**current, 'days': bytes(current['days'])}
+                current = {'employee_id': row['employee_id'], 'month': month, 'days': bytearray(empty_month(month))}
+            current['days'][row['date'].day - 1] = codes[row['status']]
+        if current is not None:
+            yield {**current, 'days': bytes(current['days'])}
+
+    def payroll_rows():
+        for employee_id, _, _, _, start, left in employees:
+            salary = rng.randrange(300000, 1500000)
+            pay_day = date(first_day.year, first_day.month, 28)
+            last = left or end
+            while pay_day <= last:
+                if pay_day >= start:
+                    yield {'employee_id': employee_id, 'amount_cents': salary, 'payment_date': pay_day}
+                pay_day = (pay_day + timedelta(days=31)).replace(day=28)
+
+    def offboarding_rows():
+        for employee_id, _, _, _, _, left in employees:
+            if left:
+                yield {'employee_id': employee_id, 'offboarding_date': left, 'reason': rng.choice(REASONS)}
+
+    return [
+        (Role, ({'id': i, 'name': name} for i, name in enumerate(ROLES, 1))),
+        (Employee, employee_rows()),
+        (User, user_rows()),
+        (Offboarding, offboarding_rows()),
+        (Payroll, payroll_rows()),
+        (AttendanceMonth, attendance_month_rows()) if attendance_is_bitmap() else (Attendance, attendance_rows()),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--employees', type=int, default=1000)
+    parser.add_argument('--users', type=int, default=None, help='defaults to employees / 10')
+    parser.add_argument('--days', type=int, default=365, help='days of attendance history')
+    parser.add_argument('--offboarded', type=float, default=0.1, help='fraction of employees who left')
+    parser.add_argument('--end-date', type=date.fromisoformat, default=date.today())
+    parser.add_argument('--chunk-size', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    if args.users is None:
+        args.users = max(1, args.employees // 10)
+
+    with create_app().app_context():
+        for model, rows in generate(args):
+            started = time.perf_counter()
+            count = chunked_insert(model, rows, args.chunk_size)
+            elapsed = time.perf_counter() - started
+            print(f'{model.__tablename__}: {count} rows in {elapsed:.1f}s ({count / max(elapsed, 1e-9):.0f} rows/s)')
+        rebuild_attendance_rollups()
+        print('Attendance rollups rebuilt.')
+        rebuild_workforce_timeline()
+        print('Workforce timeline rebuilt.')
+
+
+if __name__ == '__main__':
+    main()